@@ -0,0 +1,16 @@
+import os
+
+
+def settings():
+    # ustawienia można zmienić przed setup(), np. DEBUG czy bazę testową
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'master.settings')
+
+    from django.conf import settings
+    return settings
+
+
+def setup():
+    settings()
+
+    import django
+    django.setup()
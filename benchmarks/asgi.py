@@ -0,0 +1,174 @@
+# python -m benchmarks.asgi --size 5000 --clients 64 --requests 2000
+# mieszany ruch: wolne (--slow) i szybkie (--fast) adresy, ta sama liczba
+# klientów przeciw puli wątków WSGI (jak serwer wątkowy) i pętli ASGI
+# z master.asgi_handler; obie strony mają tyle samo wątków (--threads),
+# ASGI dzieli je na dwie pule; opóźnienia liczone od wysłania requestu,
+# z kolejką
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import settings as get_settings, setup
+from .urls import call, percentile, seed
+
+
+def workload(args):
+    rnd = random.Random(0)
+    return [args.slow if rnd.random() < args.slow_ratio else args.fast
+            for _ in range(args.requests)]
+
+
+def summary(mode, paths, latencies, total):
+    statuses = {}
+    for _, _, status in latencies:
+        statuses[status] = statuses.get(status, 0) + 1
+    result = {'mode': mode, 'rps': len(latencies) / total,
+              'statuses': statuses}
+    for kind, path in (('slow', paths[0]), ('fast', paths[1])):
+        values = [elapsed for p, elapsed, _ in latencies if p == path]
+        if values:
+            result[f'{kind}_p50_ms'] = percentile(values, 50) * 1000
+            result[f'{kind}_p99_ms'] = percentile(values, 99) * 1000
+    return result
+
+
+def run_wsgi(application, requests, clients, threads):
+    server = ThreadPoolExecutor(threads)
+    queue = iter(requests)
+    lock = threading.Lock()
+    latencies = []
+
+    def client(_):
+        while True:
+            with lock:
+                path = next(queue, None)
+            if path is None:
+                return
+            start = time.perf_counter()
+            _, status = server.submit(call, application, path).result()
+            with lock:
+                latencies.append((path, time.perf_counter() - start, status))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as pool:
+        list(pool.map(client, range(clients)))
+    total = time.perf_counter() - start
+    server.shutdown()
+    return latencies, total
+
+
+async def asgi_call(application, path):
+    path, _, query = path.partition('?')
+    scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET',
+             'scheme': 'http', 'path': path,
+             'query_string': query.encode(), 'root_path': '',
+             'headers': [(b'host', b'localhost')],
+             'client': ('127.0.0.1', 50000),
+             'server': ('localhost', 80)}
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    status = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def run_asgi(application, requests, clients):
+    queue = iter(requests)
+    latencies = []
+
+    async def client():
+        for path in queue:
+            start = time.perf_counter()
+            status = await asgi_call(application, path)
+            latencies.append((path, time.perf_counter() - start, status))
+
+    async def main():
+        await asyncio.gather(*(client() for _ in range(clients)))
+
+    start = time.perf_counter()
+    asyncio.get_event_loop().run_until_complete(main())
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=2000,
+                        help='number of books to seed')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=64,
+                        help='concurrent clients')
+    parser.add_argument('--threads', type=int,
+                        help='threads on each side (default: ASGI_THREADS '
+                             '+ ASGI_IO_THREADS from settings)')
+    parser.add_argument('--io-threads', type=int,
+                        help='how many of --threads form the ASGI pool for '
+                             'ASGI_IO_VIEWS (default: the settings ratio)')
+    parser.add_argument('--slow', default='/books/catalogue/')
+    parser.add_argument('--fast', default='/hello/')
+    parser.add_argument('--slow-ratio', type=float, default=0.2)
+    parser.add_argument('--database',
+                        help='sqlite file for the seeded data, reused '
+                             'between runs (default: in memory)')
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.DEBUG = False
+    if args.database:
+        settings.DATABASES['default']['TEST'] = {'NAME': args.database}
+    setup()
+
+    from django.db import connection
+
+    # osobna baza testowa - db.sqlite3 zostaje nietknięta;
+    # serialize=False - bez zrzutu zachowanej bazy do pamięci
+    connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                       serialize=False,
+                                       keepdb=bool(args.database))
+    seed(args.size)
+
+    from master.asgi_handler import ASGIHandler
+    from master.wsgi import application as wsgi_application
+
+    configured = settings.ASGI_THREADS + settings.ASGI_IO_THREADS
+    threads = args.threads or configured
+    io_threads = args.io_threads or round(
+        threads * settings.ASGI_IO_THREADS / configured)
+    io_threads = min(max(io_threads, 1), threads - 1)
+    asgi_application = ASGIHandler(wsgi_application,
+                                   threads - io_threads, io_threads)
+
+    requests = workload(args)
+    paths = (args.slow, args.fast)
+    for path in paths:
+        call(wsgi_application, path)
+
+    results = [
+        summary(f'wsgi threads={threads}', paths,
+                *run_wsgi(wsgi_application, requests, args.clients,
+                          threads)),
+        summary(f'asgi threads={threads - io_threads}+{io_threads}', paths,
+                *run_asgi(asgi_application, requests, args.clients)),
+    ]
+    for result in results:
+        print(f"{result['mode']:<22} {result['rps']:8.1f} req/s  "
+              f"slow p50 {result.get('slow_p50_ms', 0):8.2f} "
+              f"p99 {result.get('slow_p99_ms', 0):8.2f} ms  "
+              f"fast p50 {result.get('fast_p50_ms', 0):8.2f} "
+              f"p99 {result.get('fast_p99_ms', 0):8.2f} ms", file=sys.stderr)
+    json.dump({'args': vars(args), 'results': results}, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
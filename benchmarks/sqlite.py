@@ -0,0 +1,105 @@
+# python -m benchmarks.sqlite --readers 4 --seconds 5
+# równoczesne odczyty i zapisy na pliku sqlite:
+# domyślne ustawienia połączenia vs SQLITE_PRAGMAS z master.settings
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from . import settings as get_settings
+
+ROWS = 20000
+
+
+def connect(path, pragmas):
+    # timeout 5 s - tyle co domyślnie w django
+    db = sqlite3.connect(path, timeout=5, isolation_level=None,
+                         check_same_thread=False)
+    for name, value in pragmas.items():
+        db.execute(f'PRAGMA {name} = {value}')
+    return db
+
+
+def prepare(path, pragmas):
+    db = connect(path, pragmas)
+    db.execute('CREATE TABLE book (id INTEGER PRIMARY KEY, title TEXT)')
+    db.execute('CREATE INDEX book_title ON book (title)')
+    db.execute('BEGIN')
+    db.executemany('INSERT INTO book (title) VALUES (?)',
+                   ((f'title {n:06d}',) for n in range(ROWS)))
+    db.execute('COMMIT')
+    db.close()
+
+
+def run(path, pragmas, readers, seconds):
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def count(name):
+        with lock:
+            counts[name] += 1
+
+    def reader():
+        db = connect(path, pragmas)
+        while time.perf_counter() < stop:
+            prefix = f'title {random.randrange(ROWS):06d}'[:-2]
+            try:
+                db.execute('SELECT id, title FROM book WHERE title >= ? '
+                           'ORDER BY title LIMIT 20', (prefix,)).fetchall()
+                count('reads')
+            except sqlite3.OperationalError:
+                count('errors')
+        db.close()
+
+    def writer():
+        # jak zapis z admina - krótkie transakcje, każda z commitem
+        db = connect(path, pragmas)
+        while time.perf_counter() < stop:
+            try:
+                db.execute('BEGIN IMMEDIATE')
+                db.execute('UPDATE book SET title = ? WHERE id = ?',
+                           (f'title {random.randrange(ROWS):06d}',
+                            random.randrange(1, ROWS)))
+                db.execute('COMMIT')
+                count('writes')
+            except sqlite3.OperationalError:
+                count('errors')
+                if db.in_transaction:
+                    db.execute('ROLLBACK')
+        db.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {name: value / seconds for name, value in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    configurations = {
+        'default': {},
+        'SQLITE_PRAGMAS': get_settings().SQLITE_PRAGMAS,
+    }
+    for name, pragmas in configurations.items():
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.sqlite3')
+            prepare(path, pragmas)
+            result = run(path, pragmas, args.readers, args.seconds)
+        print(f'{name:<16} {result["reads"]:10.0f} reads/s '
+              f'{result["writes"]:8.0f} writes/s '
+              f'{result["errors"]:6.1f} errors/s')
+
+
+if __name__ == '__main__':
+    main()
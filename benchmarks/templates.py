@@ -0,0 +1,55 @@
+# python -m benchmarks.templates
+# parsowanie szablonu przy każdym requeście vs render z cache
+import timeit
+from datetime import datetime, timedelta
+
+from . import setup
+
+NUMBER = 2000
+
+
+def report(name, seconds):
+    print(f'{name:<45} {seconds / NUMBER * 1e6:8.1f} us/render')
+
+
+def main():
+    setup()
+
+    from django.conf import settings
+    from django.template import Context, Engine, Template
+    from django.template.loader import get_template
+
+    from master.inline_templates import inline_template
+
+    source = open(settings.BASE_DIR + '/templates/order_notice.html').read()
+    context = Context({
+        'person_name': 'John Doe',
+        'company': 'gooseberry',
+        'ship_date': datetime.now() + timedelta(72),
+        'item_list': ['scissors', 'paper', 'rock'],
+        'ordered_warranty': True,
+    })
+
+    report('inline: Template(source).render()', timeit.timeit(
+        lambda: Template(source).render(context), number=NUMBER))
+    report('inline: inline_template(source).render()', timeit.timeit(
+        lambda: inline_template(source).render(context), number=NUMBER))
+
+    # ten sam szablon z pliku, bez i z cached.Loader
+    template_options = settings.TEMPLATES[0]
+    uncached = Engine(dirs=template_options['DIRS'], debug=settings.DEBUG,
+                      loaders=[
+                          'django.template.loaders.filesystem.Loader',
+                          'django.template.loaders.app_directories.Loader',
+                      ])
+    flat = context.flatten()
+    report('file: get_template() without cached.Loader', timeit.timeit(
+        lambda: uncached.get_template('order_notice.html').render(context),
+        number=NUMBER))
+    report('file: get_template() with cached.Loader', timeit.timeit(
+        lambda: get_template('order_notice.html').render(flat),
+        number=NUMBER))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+# python -m benchmarks.urls --sizes 1000,100000 --requests 200 -o out.json
+# przepustowość i opóźnienia (p50/p99) każdego adresu z master.urls,
+# aplikacja WSGI z master.wsgi wywoływana w tym samym procesie
+import argparse
+import io
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from . import settings as get_settings, setup
+
+# przykładowy adres dla każdego wzorca z master.urls
+SAMPLE_PATHS = [
+    '/',
+    '/hello/',
+    '/time/',
+    '/time/plus/3/',
+    '/order_notice/',
+    '/time/get-template/',
+    '/time/render-shortcut/',
+    '/greeting/',
+    '/utilities/time/',
+    '/utilities/time/plus/3/',
+    '/utilities/request/?bla=bla&name=user',
+    '/utilities/request/meta/',
+    '/books/search/',
+    '/books/search/?q=python',
+    '/books/search/?q=python+django',
+    '/books/search/cache/',
+    '/books/catalogue/',
+    '/books/catalogue/?format=csv',
+    '/books/typeahead/?q=py',
+    '/books/stats/',
+    '/contact/',
+    '/contact/thanks/',
+    '/testing/1',
+    '/cp/',
+    '/cpshort/',
+    '/cpglobal/',
+    '/_stats/',
+    '/admin/login/',
+    '/debuginfo/',
+    '/debuginfo/context-processors/',
+]
+
+WORDS = ('python django web framework guide cookbook learning practical '
+         'advanced modern patterns testing design data science deep '
+         'algorithms systems network security programming introduction '
+         'handbook essentials mastering fluent effective clean').split()
+FIRST_NAMES = 'Adam Anna Jan Maria Piotr Ewa Tomasz Kasia Marek Ola'.split()
+LAST_NAMES = ('Nowak Kowalski Wiśniewski Wójcik Kowalczyk Kamiński '
+              'Lewandowski Zieliński Szymański Woźniak').split()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(size, chunk_size=5000):
+    # dokładamy wiersze do zadanej liczby książek;
+    # bulk_create nie wysyła sygnałów, więc indeks fts, tabelę BookDocument
+    # i liczniki katalogu przebudowujemy na końcu
+    from django.db import transaction
+
+    from books import documents, search, stats
+    from books.models import Author, Book, Publisher
+
+    rnd = random.Random(size)
+    existing = Book.objects.count()
+    if existing >= size:
+        return
+
+    publishers = max(10, size // 1000)
+    authors = max(50, size // 5)
+    with transaction.atomic():
+        start = Publisher.objects.count()
+        Publisher.objects.bulk_create(
+            Publisher(name=f'Publisher {n}', address=f'{n} Main Street',
+                      city=f'City {n % 50}', state_province='',
+                      country=f'Country {n % 10}',
+                      website=f'http://publisher{n}.example.com/')
+            for n in range(start, publishers))
+        start = Author.objects.count()
+        Author.objects.bulk_create(
+            Author(first_name=rnd.choice(FIRST_NAMES),
+                   last_name=f'{rnd.choice(LAST_NAMES)}{n}')
+            for n in range(start, authors))
+
+    publisher_ids = list(Publisher.objects.values_list('pk', flat=True))
+    author_ids = list(Author.objects.values_list('pk', flat=True))
+    next_id = (Book.objects.order_by('-pk')
+               .values_list('pk', flat=True).first() or 0) + 1
+    Through = Book.authors.through
+
+    for start in range(existing, size, chunk_size):
+        count = min(chunk_size, size - start)
+        ids = range(next_id, next_id + count)
+        next_id += count
+        with transaction.atomic():
+            Book.objects.bulk_create(
+                Book(pk=pk,
+                     title=' '.join(rnd.sample(WORDS, 3)).title(),
+                     publisher_id=rnd.choice(publisher_ids),
+                     publication_date=None)
+                for pk in ids)
+            Through.objects.bulk_create(
+                Through(book_id=pk, author_id=author_id)
+                for pk in ids
+                for author_id in rnd.sample(author_ids, rnd.randint(1, 3)))
+
+    search.rebuild_index()
+    documents.rebuild()
+    stats.reconcile()
+
+
+def check_coverage(paths):
+    # każdy wzorzec z master.urls (poza adminem) musi mieć przykładowy adres
+    from django.core.urlresolvers import (RegexURLResolver, get_resolver,
+                                          resolve)
+
+    def patterns(resolver):
+        for pattern in resolver.url_patterns:
+            if isinstance(pattern, RegexURLResolver):
+                if pattern.app_name != 'admin':
+                    yield from patterns(pattern)
+            else:
+                yield pattern
+
+    covered = {resolve(path.split('?')[0]).func for path in paths}
+    return [pattern.regex.pattern for pattern in patterns(get_resolver())
+            if pattern.callback not in covered]
+
+
+def call(application, path):
+    path, _, query = path.partition('?')
+    environ = {'PATH_INFO': path, 'QUERY_STRING': query,
+               'REMOTE_ADDR': '127.0.0.1', 'HTTP_HOST': 'localhost',
+               'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr}
+    setup_testing_defaults(environ)
+    status = []
+
+    def start_response(s, headers, exc_info=None):
+        status.append(int(s.split()[0]))
+
+    start = time.perf_counter()
+    response = application(environ, start_response)
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return time.perf_counter() - start, status[0]
+
+
+def measure(application, path, requests, concurrency):
+    for _ in range(min(10, requests)):
+        call(application, path)
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker(_):
+        elapsed, status = call(application, path)
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, range(requests)))
+    total = time.perf_counter() - start
+
+    return {
+        'path': path,
+        'requests': requests,
+        'concurrency': concurrency,
+        'rps': requests / total,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'statuses': statuses,
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r['size'], r['path']): r for r in json.load(f)['results']}
+    for result in results:
+        old = baseline.get((result['size'], result['path']))
+        if old:
+            change = (result['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+            print(f"{result['size']:>8} {result['path']:<40} "
+                  f"p50 {old['p50_ms']:8.2f} -> {result['p50_ms']:8.2f} ms "
+                  f"({change:+.0f}%)", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000',
+                        help='comma separated numbers of books to seed')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--database',
+                        help='sqlite file for the seeded data, reused '
+                             'between runs (default: in memory)')
+    parser.add_argument('--debug', action='store_true',
+                        help='run with DEBUG = True as in master.settings')
+    parser.add_argument('-o', '--output', help='write results as json')
+    parser.add_argument('--compare', help='json results to compare with')
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.DEBUG = args.debug
+    if args.database:
+        settings.DATABASES['default']['TEST'] = {'NAME': args.database}
+    setup()
+
+    import django
+    from django.db import connection
+
+    # osobna baza testowa - db.sqlite3 zostaje nietknięta;
+    # serialize=False - bez zrzutu zachowanej bazy do pamięci
+    connection.creation.create_test_db(verbosity=0, autoclobber=True,
+                                       serialize=False,
+                                       keepdb=bool(args.database))
+
+    from master.wsgi import application
+
+    paths = [path for path in SAMPLE_PATHS
+             if args.debug or not path.startswith('/debuginfo/')]
+    missing = check_coverage(paths)
+    if missing:
+        print(f'no sample path for: {", ".join(missing)}', file=sys.stderr)
+
+    results = []
+    for size in sorted(int(s) for s in args.sizes.split(',')):
+        seed(size)
+        for path in paths:
+            result = measure(application, path, args.requests,
+                             args.concurrency)
+            result['size'] = size
+            results.append(result)
+            print(f"{size:>8} {path:<40} {result['rps']:8.1f} req/s "
+                  f"p50 {result['p50_ms']:7.2f} ms "
+                  f"p99 {result['p99_ms']:7.2f} ms", file=sys.stderr)
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
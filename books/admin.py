@@ -1,13 +1,29 @@
+from django.conf.urls import url
 from django.contrib import admin
-from .models import Publisher, Author, Book
+from django.core.exceptions import PermissionDenied
+from django.core.urlresolvers import reverse, reverse_lazy
+from django.utils.html import format_html
 
+from .changelist import PerformanceAdminMixin
+from .models import Publisher, Author, Book, BookDocument
+from .pickers import (AuthorPicker, PublisherPicker, author_choices,
+                      filter_name_prefix, lookup_view, publisher_choices)
+from .search import query_terms
 
-class AuthorAdmin(admin.ModelAdmin):
+
+class AuthorAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ('first_name', 'last_name', 'email')
     search_fields = ('first_name', 'last_name')
 
+    def get_search_results(self, request, queryset, search_term):
+        # każde słowo to początek imienia albo nazwiska, z indeksu;
+        # icontains po obu kolumnach przeglądał całą tabelę
+        for word in search_term.split():
+            queryset = filter_name_prefix(queryset, word)
+        return queryset, False
+
 
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(PerformanceAdminMixin, admin.ModelAdmin):
     list_display = ('title', 'publisher', 'publication_date')
     list_filter = ('publication_date',)
     date_hierarchy = 'publication_date'
@@ -15,10 +31,76 @@ class BookAdmin(admin.ModelAdmin):
     # formularz edycji
     # nie wyświetlamy publication_date
     fields = ('title', 'authors', 'publisher')
-    filter_horizontal = ('authors',)
-    raw_id_fields = ('publisher',)
+
+    # zamiast filter_horizontal i raw_id_fields: na stronie tylko wybrani
+    # autorzy i wydawca, reszta stronami z widoków lookup
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name == 'authors':
+            kwargs['widget'] = AuthorPicker(
+                reverse_lazy('admin:books_book_author_lookup'))
+            field = super().formfield_for_manytomany(db_field, request,
+                                                     **kwargs)
+            # zamiast podpowiedzi o Ctrl dla zwykłego SelectMultiple
+            field.help_text = ('Type a name prefix to find authors, '
+                               'double-click an author to remove it.')
+            return field
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'publisher':
+            kwargs['widget'] = PublisherPicker(
+                reverse_lazy('admin:books_book_publisher_lookup'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_urls(self):
+        def lookup(choices):
+            view = lookup_view(choices)
+
+            def check(request):
+                if not self.has_change_permission(request) and \
+                        not self.has_add_permission(request):
+                    raise PermissionDenied
+                return view(request)
+            return self.admin_site.admin_view(check)
+
+        return [
+            url(r'^authors/lookup/$', lookup(author_choices),
+                name='books_book_author_lookup'),
+            url(r'^publishers/lookup/$', lookup(publisher_choices),
+                name='books_book_publisher_lookup'),
+        ] + super().get_urls()
+
+
+class BookDocumentAdmin(admin.ModelAdmin):
+    # lista książek z autorami i wydawcą jednym zapytaniem do jednej tabeli;
+    # tylko do odczytu, edycja przez BookAdmin
+    list_display = ('title', 'authors', 'publisher', 'year', 'edit_link')
+    list_display_links = None
+    list_filter = ('year',)
+    ordering = ('title', 'book')
+    search_fields = ('search_key',)
+    readonly_fields = ('book', 'title', 'authors', 'publisher', 'year',
+                       'search_key')
+
+    def get_search_results(self, request, queryset, search_term):
+        # search_key jest znormalizowany, więc zapytanie też
+        for term in query_terms(search_term):
+            queryset = queryset.filter(search_key__contains=term)
+        return queryset, False
+
+    def edit_link(self, obj):
+        url = reverse('admin:books_book_change', args=[obj.pk])
+        return format_html('<a href="{}">edit</a>', url)
+    edit_link.short_description = 'book'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 admin.site.register(Author, AuthorAdmin)
 admin.site.register(Book, BookAdmin)
+admin.site.register(BookDocument, BookDocumentAdmin)
 admin.site.register(Publisher)
@@ -0,0 +1,312 @@
+import csv
+import itertools
+import json
+
+from django.db import transaction
+
+from . import stats
+from .cache import bump_catalogue_version
+from .models import Author, Book, Publisher
+from .signals import books_changed
+
+CHUNK_SIZE = 1000
+# limit zmiennych w jednym zapytaniu sqlite (999 przed 3.32)
+QUERY_CHUNK_SIZE = 500
+# ile znaków eksportu idzie do klienta naraz
+STREAM_BUFFER_SIZE = 8192
+
+PUBLISHER_FIELDS = ('name', 'address', 'city', 'state_province', 'country',
+                    'website')
+AUTHOR_FIELDS = ('first_name', 'last_name', 'email')
+# w csv imiona i nazwiska autorów w dwóch kolumnach, w tej samej
+# kolejności: "Jan; Anna" i "Nowak; Kowalska"; przy imporcie można też
+# podać jedną kolumnę authors: "Jan Nowak; Anna Kowalska"
+BOOK_FIELDS = ('title', 'publisher', 'publication_date',
+               'author_first_names', 'author_last_names')
+AUTHORS_SEPARATOR = ';'
+
+
+def read_rows(f, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(f)
+    else:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def chunks(rows, size=CHUNK_SIZE):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_chunks(queryset, size=CHUNK_SIZE):
+    # seek po pk zamiast iterator() - sqlite w django i tak pobiera
+    # cały wynik naraz, a tu w pamięci jest najwyżej jedna paczka
+    last = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last).order_by('pk')[:size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1].pk
+
+
+def split_name(full_name):
+    # tylko dla nazwisk z jednego słowa, np. w ręcznie pisanym csv
+    first_name, _, last_name = full_name.strip().rpartition(' ')
+    return first_name, last_name
+
+
+def _split_list(value):
+    return [item.strip() for item in value.split(AUTHORS_SEPARATOR)]
+
+
+def author_names(row):
+    # (imię, nazwisko) autorów książki z wiersza csv albo json
+    if row.get('author_first_names') or row.get('author_last_names'):
+        return list(zip(_split_list(row.get('author_first_names') or ''),
+                        _split_list(row.get('author_last_names') or '')))
+    authors = row.get('authors') or []
+    if isinstance(authors, str):
+        authors = [name for name in authors.split(AUTHORS_SEPARATOR)
+                   if name.strip()]
+    return [(author['first_name'], author['last_name'])
+            if isinstance(author, dict) else split_name(author)
+            for author in authors]
+
+
+def _last_pk(model):
+    return model.objects.order_by('-pk').values_list('pk', flat=True).first()
+
+
+def _bulk_create(model, objects, *fields):
+    # sqlite nie zwraca id z bulk_create; nowe wiersze mają id większe
+    # od dotychczasowego maksimum, więc dopytujemy o nie po zakresie pk,
+    # a wiersze dodane w tym czasie przez inne procesy odrzucamy po fields
+    if not objects:
+        return []
+    keys = {tuple(getattr(obj, field) for field in fields)
+            for obj in objects}
+    last = _last_pk(model) or 0
+    model.objects.bulk_create(objects)
+    return [(pk, *values) for pk, *values in
+            model.objects.filter(pk__gt=last).values_list('pk', *fields)
+            if tuple(values) in keys]
+
+
+class Importer:
+    # mapy nazwa -> id dla wydawców i autorów są w pamięci przez cały import
+    # (jest ich o rzędy wielkości mniej niż książek),
+    # książki sprawdzamy w bazie paczkami
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.publishers = dict(Publisher.objects.values_list('name', 'pk'))
+        self.authors = {
+            (first_name, last_name): pk
+            for pk, first_name, last_name in Author.objects.values_list(
+                'pk', 'first_name', 'last_name').iterator()}
+        self.created = {'publishers': 0, 'authors': 0, 'books': 0}
+        self.skipped = 0
+
+    def run(self, kind, rows):
+        load = getattr(self, f'load_{kind}')
+        for chunk in chunks(rows, self.chunk_size):
+            with transaction.atomic():
+                load(chunk)
+        return self.created, self.skipped
+
+    def _add_publishers(self, rows):
+        created = _bulk_create(
+            Publisher,
+            [Publisher(**{field: row.get(field) or ''
+                          for field in PUBLISHER_FIELDS})
+             for row in rows],
+            'name')
+        self.publishers.update((name, pk) for pk, name in created)
+        self.created['publishers'] += len(rows)
+        if created:
+            # bulk_create nie wysyła sygnałów; nowa wersja katalogu
+            # przebuduje indeks typeahead i strony z cache
+            bump_catalogue_version()
+
+    def _add_authors(self, rows):
+        created = _bulk_create(
+            Author,
+            [Author(**{field: row.get(field) or ''
+                       for field in AUTHOR_FIELDS})
+             for row in rows],
+            'first_name', 'last_name')
+        self.authors.update(((first_name, last_name), pk)
+                            for pk, first_name, last_name in created)
+        self.created['authors'] += len(rows)
+        if created:
+            bump_catalogue_version()
+
+    def load_publishers(self, rows):
+        new = {}
+        for row in rows:
+            if row['name'] in self.publishers or row['name'] in new:
+                self.skipped += 1
+            else:
+                new[row['name']] = row
+        self._add_publishers(list(new.values()))
+
+    def load_authors(self, rows):
+        new = {}
+        for row in rows:
+            key = (row['first_name'], row['last_name'])
+            if key in self.authors or key in new:
+                self.skipped += 1
+            else:
+                new[key] = row
+        self._add_authors(list(new.values()))
+
+    def load_books(self, rows):
+        for row in rows:
+            row['authors'] = list(dict.fromkeys(author_names(row)))
+
+        # wydawcy i autorzy, których jeszcze nie ma, dostają tylko nazwę
+        self._add_publishers([
+            {'name': name}
+            for name in dict.fromkeys(row['publisher'] for row in rows)
+            if name not in self.publishers])
+        self._add_authors([
+            {'first_name': first_name, 'last_name': last_name}
+            for first_name, last_name in dict.fromkeys(
+                key for row in rows for key in row['authors'])
+            if (first_name, last_name) not in self.authors])
+
+        existing = set()
+        for titles in chunks({row['title'] for row in rows},
+                             QUERY_CHUNK_SIZE):
+            existing.update(Book.objects.filter(title__in=titles)
+                            .values_list('title', 'publisher_id'))
+        new = {}
+        for row in rows:
+            key = (row['title'], self.publishers[row['publisher']])
+            if key in existing or key in new:
+                self.skipped += 1
+            else:
+                new[key] = row
+
+        created = _bulk_create(
+            Book,
+            [Book(title=title, publisher_id=publisher_id,
+                  publication_date=row.get('publication_date') or None)
+             for (title, publisher_id), row in new.items()],
+            'title', 'publisher_id')
+        ids = {(title, publisher_id): pk
+               for pk, title, publisher_id in created}
+        Book.authors.through.objects.bulk_create(
+            Book.authors.through(book_id=ids[key],
+                                 author_id=self.authors[author])
+            for key, row in new.items()
+            for author in row['authors'])
+
+        # bulk_create nie wysyła sygnałów - indeks, cache i liczniki ręcznie
+        books_changed(ids.values())
+        for chunk in chunks(ids.values(), QUERY_CHUNK_SIZE):
+            stats.apply(stats.contributions(Book.objects.filter(pk__in=chunk)))
+        self.created['books'] += len(new)
+
+
+def export_rows(kind, chunk_size=CHUNK_SIZE):
+    if kind == 'publishers':
+        for chunk in iter_chunks(Publisher.objects.all(), chunk_size):
+            for publisher in chunk:
+                yield {field: getattr(publisher, field)
+                       for field in PUBLISHER_FIELDS}
+    elif kind == 'authors':
+        for chunk in iter_chunks(Author.objects.all(), chunk_size):
+            for author in chunk:
+                yield {field: getattr(author, field)
+                       for field in AUTHOR_FIELDS}
+    else:
+        for chunk in _book_chunks(chunk_size):
+            yield from chunk
+
+
+def _book_chunks(size):
+    # values_list i jedno zapytanie o autorów na paczkę, jak
+    # search.book_rows - instancje z prefetch_related kosztowały
+    # ok. 0.7 ms na książkę
+    last = 0
+    while True:
+        books = list(Book.objects.filter(pk__gt=last).order_by('pk')
+                     .values_list('pk', 'title', 'publisher__name',
+                                  'publication_date')[:size])
+        if not books:
+            return
+        last = books[-1][0]
+        # zakres id zamiast IN - bez limitu zmiennych sqlite
+        authors = {}
+        for book_id, first_name, last_name in (
+                Book.authors.through.objects
+                .filter(book_id__gte=books[0][0], book_id__lte=last)
+                .order_by('pk')
+                .values_list('book_id', 'author__first_name',
+                             'author__last_name')):
+            # osobno imię i nazwisko - nazwisko może mieć kilka słów,
+            # np. van Rossum
+            authors.setdefault(book_id, []).append(
+                {'first_name': first_name, 'last_name': last_name})
+        yield [{'title': title,
+                'publisher': publisher,
+                'publication_date': (publication_date.isoformat()
+                                     if publication_date else ''),
+                'authors': authors.get(pk, [])}
+               for pk, title, publisher, publication_date in books]
+
+
+class _Line:
+    # csv.writer oddaje sformatowany wiersz zamiast go zapisywać
+    def write(self, value):
+        return value
+
+
+def format_rows(fmt, kind, rows):
+    # kolejne linie pliku, do zapisu albo do StreamingHttpResponse
+    if fmt == 'csv':
+        fields = {'publishers': PUBLISHER_FIELDS,
+                  'authors': AUTHOR_FIELDS,
+                  'books': BOOK_FIELDS}[kind]
+        writer = csv.DictWriter(_Line(), fields)
+        yield writer.writerow(dict(zip(fields, fields)))
+        for row in rows:
+            if kind == 'books':
+                separator = AUTHORS_SEPARATOR + ' '
+                authors = row.pop('authors')
+                for field in ('first_name', 'last_name'):
+                    row[f'author_{field}s'] = separator.join(
+                        author[field] for author in authors)
+            yield writer.writerow(row)
+    else:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def buffered(lines, size=STREAM_BUFFER_SIZE):
+    # linie sklejane w paczki po kilka KB - jeden write() serwera
+    # na paczkę, a nie na wiersz
+    buffer = []
+    length = 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def write_rows(f, fmt, kind, rows):
+    for line in format_rows(fmt, kind, rows):
+        f.write(line)
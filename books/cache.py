@@ -0,0 +1,144 @@
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, router, transaction
+
+from master.cache import is_shared
+
+from .models import CatalogueVersion
+from .search import normalise, query_terms
+
+CACHE_ALIAS = 'books-search'
+GENERATION_KEY = 'books-search-generation'
+
+# wersje słów dłuższych niż MAX_TERM_LENGTH są wspólne z ich prefiksem
+# tej długości; tyle wpisów najwyżej ustawia zmiana jednego słowa
+MAX_TERM_LENGTH = 20
+
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_stats_lock = threading.Lock()
+
+# ostatnia wersja katalogu widziana przez ten proces
+_seen_version = None
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def _term_key(term):
+    return f'books-search-term:{term[:MAX_TERM_LENGTH]}'
+
+
+def _versions(cache, keys):
+    # wersja to losowy token, a nie licznik - wersja wyrzucona z cache
+    # nie może wskrzesić starych wpisów
+    versions = cache.get_many(keys)
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def _entry_key(cache, q, variant):
+    # wpis zależy od wersji każdego słowa zapytania i od generacji
+    # całego cache, więc unieważnienie nie musi znać zapisanych zapytań
+    keys = [GENERATION_KEY, *map(_term_key, query_terms(q))]
+    versions = _versions(cache, keys)
+    digest = hashlib.md5(
+        '\x00'.join([normalise(q), *versions]).encode()).hexdigest()
+    return f'books-search:{digest}:{variant}'
+
+
+def get_results(q, variant):
+    cache = caches[CACHE_ALIAS]
+    value = cache.get(_entry_key(cache, q, variant))
+    _count('misses' if value is None else 'hits')
+    return value
+
+
+def set_results(q, variant, value):
+    if not query_terms(q):
+        return
+    cache = caches[CACHE_ALIAS]
+    cache.set(_entry_key(cache, q, variant), value)
+
+
+def invalidate(texts=None):
+    # texts - treść zmienionych książek sprzed i po zmianie;
+    # słowo zapytania pasuje do tekstu, gdy jest prefiksem któregoś z jego
+    # słów, więc nowe wersje dostają wszystkie takie prefiksy - unieważnione
+    # są zapytania z choć jednym pasującym słowem, reszta zostaje;
+    # None - nie wiadomo co się zmieniło, nowa generacja unieważnia wszystko
+    cache = caches[CACHE_ALIAS]
+    if texts is None:
+        cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
+        _count('invalidations')
+        return
+    keys = {_term_key(token[:length])
+            for text in texts
+            for token in query_terms(text)
+            for length in range(1, min(len(token), MAX_TERM_LENGTH) + 1)}
+    if keys:
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+        _count('invalidations')
+
+
+def _flush_on_foreign_change():
+    # zmiana katalogu z innego procesu albo zaległa replika - wiemy tylko,
+    # że coś się zmieniło, nie co; wystarczy unieważnianie przy zapisie,
+    # jeśli cache jest wspólny, a odczyty idą do bazy głównej
+    return (not is_shared(CACHE_ALIAS) or
+            bool(getattr(settings, 'BOOKS_READ_REPLICAS', [])))
+
+
+def catalogue_version(using=None):
+    # zmienia się przy każdej zmianie książek, autorów lub wydawców;
+    # z niej liczony jest ETag stron z katalogu, więc czytamy ją z tej
+    # samej bazy (repliki), z której request czyta dane
+    global _seen_version
+    if using is None:
+        using = router.db_for_read(CatalogueVersion)
+    version = (CatalogueVersion.objects.using(using)
+               .values_list('token', flat=True).first()) or ''
+    if version != _seen_version:
+        if _seen_version is not None and _flush_on_foreign_change():
+            invalidate()
+        _seen_version = version
+    return version
+
+
+def bump_catalogue_version(using=None):
+    # wersja w bazie, a nie w cache - widzą ją wszystkie procesy
+    # i nie wypada z cache razem z wpisami;
+    # zwraca (poprzednia, nowa) - books.typeahead przechodzi na nową
+    # wersję bez przebudowy tylko z poprzedniej
+    global _seen_version
+    if using is None:
+        using = router.db_for_write(CatalogueVersion)
+    token = uuid.uuid4().hex
+    versions = CatalogueVersion.objects.using(using)
+    previous = versions.filter(pk=1).values_list('token', flat=True).first()
+    if not versions.filter(pk=1).update(token=token):
+        try:
+            with transaction.atomic(using=using):
+                versions.create(pk=1, token=token)
+        except IntegrityError:
+            # równoległy zapis utworzył wiersz pierwszy
+            versions.filter(pk=1).update(token=token)
+    # ten proces unieważnił już swoje wpisy przy zapisie
+    _seen_version = token
+    return previous or '', token
+
+
+def stats():
+    with _stats_lock:
+        result = dict(_stats)
+    lookups = result['hits'] + result['misses']
+    result['hit_rate'] = result['hits'] / lookups if lookups else None
+    return result
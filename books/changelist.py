@@ -0,0 +1,138 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.admin.views.main import ChangeList
+from django.core.cache import caches
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Max, Min, QuerySet
+from django.utils.functional import cached_property
+
+from . import cache as search_cache
+
+# lata, miesiące i dni date_hierarchy, unieważniane razem z wersją katalogu
+DATES_CACHE_ALIAS = 'default'
+DATES_TIMEOUT = 3600
+
+
+def estimate_count(model, using):
+    # bez liczenia wierszy: w sqlite największe id (indeks rowid),
+    # w postgresql statystyka planera; None - nie umiemy oszacować
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            column = connection.ops.quote_name(model._meta.pk.column)
+            cursor.execute(f'SELECT MAX({column}) FROM {table}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class '
+                           'WHERE oid = %s::regclass', [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None else None
+
+
+class ApproximatePaginator(Paginator):
+    # COUNT(*) całej tabeli tylko dla małych tabel; przy filtrach
+    # i wyszukiwaniu liczba jest dokładna
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and \
+                    estimate > settings.BOOKS_ADMIN_EXACT_COUNT_LIMIT:
+                self.estimated = True
+                return estimate
+        return super().count
+
+    def page(self, number):
+        page = super().page(number)
+        if self.estimated and not page.object_list:
+            # po usunięciach MAX(id) jest za duże i ostatnie strony są
+            # puste - przechodzimy na dokładną liczbę i ostatnią stronę
+            self.count = Paginator.count.func(self)
+            self.estimated = False
+            for name in ('num_pages', 'page_range'):
+                self.__dict__.pop(name, None)
+            page = super().page(min(page.number, self.num_pages))
+        return page
+
+
+class ApproximateChangeList(ChangeList):
+    # paginator mógł zamienić szacunek na dokładną liczbę przy pustej stronie
+
+    def get_results(self, request):
+        super().get_results(request)
+        if self.result_count != self.paginator.count:
+            self.result_count = self.paginator.count
+            self.multi_page = self.result_count > self.list_per_page
+            self.page_num = min(self.page_num, self.paginator.num_pages - 1)
+
+
+def _date_bounds(aggregates):
+    # Min i Max jednego pola - tak date_hierarchy pyta o zakres dat
+    fields = {getattr(a.source_expressions[0], 'name', None)
+              for a in aggregates.values()
+              if isinstance(a, (Min, Max)) and
+              isinstance(a.source_expressions[0], F)}
+    return (len(aggregates) == 2 and len(fields) == 1 and
+            {type(a) for a in aggregates.values()} == {Min, Max})
+
+
+class CachedDatesQuerySet(QuerySet):
+    # date_hierarchy pyta przy każdym wyświetleniu o Min/Max i listę dat,
+    # czyli skanuje tabelę; wyniki trzymamy w cache pod wersją katalogu
+
+    def _cached(self, name, args, compute):
+        sql, params = self.query.sql_with_params()
+        version = search_cache.catalogue_version(self.db)
+        key = hashlib.md5(repr((version, name, args, sql, params))
+                          .encode()).hexdigest()
+        cache = caches[DATES_CACHE_ALIAS]
+        value = cache.get(f'admin-dates:{key}')
+        if value is None:
+            value = compute()
+            cache.set(f'admin-dates:{key}', value, DATES_TIMEOUT)
+        return value
+
+    def dates(self, field_name, kind, order='ASC'):
+        return self._cached(
+            'dates', (field_name, kind, order),
+            lambda: list(super(CachedDatesQuerySet, self)
+                         .dates(field_name, kind, order)))
+
+    def aggregate(self, *args, **kwargs):
+        if args or not _date_bounds(kwargs):
+            return super().aggregate(*args, **kwargs)
+        return self._cached(
+            'aggregate', (args, sorted(kwargs.items())),
+            lambda: super(CachedDatesQuerySet, self)
+            .aggregate(*args, **kwargs))
+
+
+class PerformanceAdminMixin:
+    # tryb dla dużych tabel: szacowana liczba wierszy, bez drugiego COUNT(*)
+    # dla "pokaż wszystkie", join tylko z kolumnami FK z list_display
+    # i date_hierarchy z cache
+    paginator = ApproximatePaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return ApproximateChangeList
+
+    def get_list_select_related(self, request):
+        opts = self.model._meta
+        fields = {field.name for field in opts.get_fields()
+                  if field.many_to_one and field.concrete}
+        return [name for name in self.get_list_display(request)
+                if name in fields]
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return CachedDatesQuerySet(model=queryset.model,
+                                   query=queryset.query,
+                                   using=queryset._db)
@@ -0,0 +1,41 @@
+from django.db import router
+
+from .models import Book, BookDocument
+from .search import book_rows, normalise
+
+REBUILD_CHUNK_SIZE = 500
+
+
+def build(pk, title, authors, publisher, publication_date):
+    return BookDocument(
+        book_id=pk,
+        title=title,
+        authors=', '.join(authors),
+        publisher=publisher,
+        year=publication_date.year if publication_date else None,
+        search_key=normalise(' '.join([title, *authors, publisher])))
+
+
+def update_documents(book_ids, using=None, rows=None):
+    book_ids = list(book_ids)
+    if using is None:
+        using = router.db_for_write(BookDocument)
+    if not book_ids:
+        return
+
+    if rows is None:
+        rows = book_rows(book_ids, using)
+    documents = BookDocument.objects.using(using)
+    documents.filter(book_id__in=book_ids).delete()
+    documents.bulk_create([build(*row) for row in rows])
+
+
+def rebuild(using=None):
+    if using is None:
+        using = router.db_for_write(BookDocument)
+
+    BookDocument.objects.using(using).all().delete()
+    book_ids = list(Book.objects.using(using).values_list('pk', flat=True))
+    for start in range(0, len(book_ids), REBUILD_CHUNK_SIZE):
+        update_documents(book_ids[start:start + REBUILD_CHUNK_SIZE],
+                         using=using)
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from books.bulk import CHUNK_SIZE, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = ('Streams publishers, authors or books into a CSV or JSON Lines '
+            'file in chunks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['publishers', 'authors', 'books'])
+        parser.add_argument('path', nargs='?', default='-',
+                            help='output file, - for stdout')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith('.jsonl')
+                                    else 'csv')
+        rows = export_rows(options['kind'], options['chunk_size'])
+
+        if path == '-':
+            # wiersze mają już własne znaki końca linii
+            self.stdout.ending = ''
+            write_rows(self.stdout, fmt, options['kind'], rows)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                write_rows(f, fmt, options['kind'], rows)
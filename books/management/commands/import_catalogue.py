@@ -0,0 +1,37 @@
+import io
+import sys
+
+from django.core.management.base import BaseCommand
+
+from books.bulk import CHUNK_SIZE, Importer, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Streams publishers, authors or books from a CSV or JSON Lines '
+            'file into the database in chunks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['publishers', 'authors', 'books'])
+        parser.add_argument('path', help='input file, - for stdin')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='defaults to the file extension')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith('.jsonl')
+                                    else 'csv')
+        if path == '-':
+            f = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+        else:
+            f = open(path, encoding='utf-8', newline='')
+
+        with f:
+            importer = Importer(options['chunk_size'])
+            created, skipped = importer.run(options['kind'],
+                                            read_rows(f, fmt))
+
+        summary = ', '.join(f'{count} {kind}'
+                            for kind, count in created.items() if count)
+        self.stdout.write(f'created {summary or "nothing"}, '
+                          f'skipped {skipped} duplicates')
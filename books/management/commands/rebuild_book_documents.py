@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from books.cache import bump_catalogue_version
+from books.documents import rebuild
+from books.models import BookDocument
+from books.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = ('Rebuilds the denormalised BookDocument table and the search '
+            'index from the books.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        rebuild(using=using)
+        rebuild_index(using=using)
+        # strony z cache i indeks typeahead w działających procesach
+        bump_catalogue_version(using)
+        count = BookDocument.objects.using(using).count()
+        self.stdout.write(f'Rebuilt {count} book documents.')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from books.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = ('Recounts the catalogue statistics and corrects counters that '
+            'drifted, e.g. after queryset updates that bypass signals. '
+            'Meant to be run periodically (cron).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='only report how many counters differ')
+
+    def handle(self, *args, **options):
+        fixed = reconcile(using=options['database'],
+                          dry_run=options['dry_run'])
+        verb = 'Found' if options['dry_run'] else 'Corrected'
+        self.stdout.write(f'{verb} {fixed} catalogue counters.')
@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from books.replication import replicate
+
+
+class Command(BaseCommand):
+    help = ('Copies the books tables from the primary database to the '
+            'SQLite read replicas in BOOKS_READ_REPLICAS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep replicating until stopped.')
+        parser.add_argument('--interval', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        replicas = settings.BOOKS_READ_REPLICAS
+        if not replicas:
+            raise CommandError('BOOKS_READ_REPLICAS is empty.')
+
+        while True:
+            for alias in replicas:
+                replicate(settings.DATABASES[alias]['NAME'])
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
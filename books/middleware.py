@@ -0,0 +1,27 @@
+from django.conf import settings
+
+from . import routers
+
+PINNED_COOKIE = 'books_pinned'
+
+
+class ReplicaPinningMiddleware:
+    # po zapisie klient przez BOOKS_REPLICA_LAG sekund czyta z bazy głównej,
+    # żeby widział własne zmiany, zanim dotrą do replik
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routers.reset()
+        if request.COOKIES.get(PINNED_COOKIE):
+            routers.pin()
+        try:
+            response = self.get_response(request)
+            if routers.wrote():
+                response.set_cookie(PINNED_COOKIE, '1',
+                                    max_age=settings.BOOKS_REPLICA_LAG,
+                                    httponly=True)
+        finally:
+            routers.reset()
+        return response
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+CREATE_SQL = """
+    CREATE VIRTUAL TABLE books_book_fts USING fts5(
+        title, authors, publisher,
+        tokenize = 'unicode61 remove_diacritics 2'
+    )
+"""
+
+POPULATE_SQL = """
+    INSERT INTO books_book_fts (rowid, title, authors, publisher)
+    SELECT b.id,
+           b.title,
+           COALESCE((SELECT group_concat(a.first_name || ' ' || a.last_name,
+                                         ' ')
+                     FROM books_book_authors ba
+                     JOIN books_author a ON a.id = ba.author_id
+                     WHERE ba.book_id = b.id), ''),
+           p.name
+    FROM books_book b
+    JOIN books_publisher p ON p.id = b.publisher_id
+"""
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_SQL)
+    schema_editor.execute(POPULATE_SQL)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS books_book_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0002_auto_20170605_1209'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import unicodedata
+
+from django.db import migrations
+
+# kopia books.search.normalise z chwili pisania migracji - migracja
+# nie może się zmieniać razem z kodem aplikacji
+LETTERS = str.maketrans({'ł': 'l', 'Ł': 'L', 'ø': 'o', 'Ø': 'O',
+                         'đ': 'd', 'Đ': 'D', 'ı': 'i'})
+
+
+def normalise(text):
+    text = unicodedata.normalize('NFKD', text.translate(LETTERS))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.casefold().split())
+
+
+def reindex(apps, schema_editor):
+    # 0003 wypełniła indeks surowym tekstem, a zapytania są normalizowane
+    # (np. ł -> l), więc przepisujemy go znormalizowanym
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+
+    Book = apps.get_model('books', 'Book')
+    books = (Book.objects.using(connection.alias)
+             .select_related('publisher')
+             .prefetch_related('authors'))
+    rows = [(book.pk,
+             normalise(book.title),
+             normalise(' '.join(f'{a.first_name} {a.last_name}'
+                                for a in book.authors.all())),
+             normalise(book.publisher.name))
+            for book in books]
+
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM books_book_fts')
+        cursor.executemany(
+            'INSERT INTO books_book_fts (rowid, title, authors, publisher) '
+            'VALUES (%s, %s, %s, %s)', rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_book_fts'),
+    ]
+
+    operations = [
+        migrations.RunPython(reindex, migrations.RunPython.noop),
+    ]
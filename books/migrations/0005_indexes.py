@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 20:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_normalise_book_fts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='publication_date',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='title',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='publisher',
+            name='name',
+            field=models.CharField(db_index=True, max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['last_name', 'first_name'], name='books_autho_last_na_7ca250_idx'),
+        ),
+        # tabela pośrednia ma unique (book_id, author_id) i indeks author_id;
+        # (author_id, book_id) pozwala przejść od autora do książek
+        # bez czytania wierszy tabeli
+        migrations.RunSQL(
+            ['CREATE INDEX books_book_authors_author_book_idx '
+             'ON books_book_authors (author_id, book_id)'],
+            ['DROP INDEX books_book_authors_author_book_idx'],
+        ),
+    ]
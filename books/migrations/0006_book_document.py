@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 20:20
+from __future__ import unicode_literals
+
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# normalizacja search_key taka jak w indeksie fts (0004), skopiowana -
+# późniejsza zmiana books.search nie może zmienić starej migracji
+LETTERS = str.maketrans({'ł': 'l', 'Ł': 'L', 'ø': 'o', 'Ø': 'O',
+                         'đ': 'd', 'Đ': 'D', 'ı': 'i'})
+
+
+def normalise(text):
+    text = unicodedata.normalize('NFKD', text.translate(LETTERS))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.casefold().split())
+
+
+def populate(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    BookDocument = apps.get_model('books', 'BookDocument')
+    using = schema_editor.connection.alias
+
+    authors = {}
+    for book_id, first_name, last_name in (
+            Book.authors.through.objects.using(using)
+            .order_by('pk')
+            .values_list('book_id', 'author__first_name',
+                         'author__last_name')):
+        authors.setdefault(book_id, []).append(f'{first_name} {last_name}')
+    BookDocument.objects.using(using).bulk_create(
+        [BookDocument(book_id=pk,
+                      title=title,
+                      authors=', '.join(authors.get(pk, ())),
+                      publisher=publisher,
+                      year=date.year if date else None,
+                      search_key=normalise(' '.join(
+                          [title, *authors.get(pk, ()), publisher])))
+         for pk, title, publisher, date in (
+             Book.objects.using(using)
+             .values_list('pk', 'title', 'publisher__name',
+                          'publication_date'))],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookDocument',
+            fields=[
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='books.Book')),
+                ('title', models.CharField(max_length=100)),
+                ('authors', models.TextField(blank=True)),
+                ('publisher', models.CharField(max_length=30)),
+                ('year', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('search_key', models.TextField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bookdocument',
+            index=models.Index(fields=['title', 'book'], name='books_bookd_title_82ca19_idx'),
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
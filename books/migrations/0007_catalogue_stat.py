@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 21:05
+from __future__ import unicode_literals
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractYear
+
+
+def contributions(Book, using):
+    # liczniki jak w books.stats.contributions z chwili pisania migracji
+    counts = Counter()
+    rows = (Book.objects.using(using).order_by()
+            .annotate(year=ExtractYear('publication_date'))
+            .values_list('publisher', 'year', 'publisher__country',
+                         'publisher__city')
+            .annotate(n=Count('pk')))
+    for publisher, year, country, city, n in rows:
+        counts[('total', '')] += n
+        counts[('publisher', str(publisher))] += n
+        counts[('year', '' if year is None else str(year))] += n
+        counts[('country', country)] += n
+        counts[('city', city)] += n
+    rows = (Book.authors.through.objects.using(using).order_by()
+            .values_list('author').annotate(n=Count('book')))
+    for author, n in rows:
+        counts[('author', str(author))] += n
+    return counts
+
+
+def populate(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    CatalogueStat = apps.get_model('books', 'CatalogueStat')
+    using = schema_editor.connection.alias
+
+    counts = contributions(Book, using)
+    CatalogueStat.objects.using(using).bulk_create(
+        [CatalogueStat(dimension=dimension, key=key, count=count)
+         for (dimension, key), count in counts.items() if count],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('total', 'all books'), ('publisher', 'books per publisher'), ('year', 'books per publication year'), ('author', 'books per author'), ('country', 'books per publisher country'), ('city', 'books per publisher city')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=60)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cataloguestat',
+            index=models.Index(fields=['dimension', 'count'], name='books_catal_dimensi_c18ff3_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cataloguestat',
+            unique_together=set([('dimension', 'key')]),
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
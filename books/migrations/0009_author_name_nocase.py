@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# LIKE w sqlite nie rozróżnia wielkości liter, więc korzysta tylko
+# z indeksu o porównaniu NOCASE; osobne indeksy dla imienia i nazwiska,
+# żeby warunek OR mógł użyć obu (MULTI-INDEX OR)
+INDEXES = {
+    'books_author_first_name_nocase': 'first_name',
+    'books_author_last_name_nocase': 'last_name',
+}
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, column in INDEXES.items():
+        schema_editor.execute(f'CREATE INDEX {name} '
+                              f'ON books_author ({column} COLLATE NOCASE)')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_catalogue_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
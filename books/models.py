@@ -2,7 +2,7 @@ from django.db import models
 
 
 class Publisher(models.Model):
-    name = models.CharField(max_length=30)
+    name = models.CharField(max_length=30, db_index=True)
     address = models.CharField(max_length=50)
     city = models.CharField(max_length=60)
     state_province = models.CharField(max_length=30)
@@ -24,12 +24,81 @@ class Author(models.Model):
     def __str__(self):
         return f'{self.first_name} {self.last_name}'
 
+    class Meta:
+        indexes = [
+            # wyszukiwanie i sortowanie po nazwisku, potem imieniu
+            models.Index(fields=['last_name', 'first_name']),
+        ]
+
 
 class Book(models.Model):
-    title = models.CharField(max_length=100)
+    title = models.CharField(max_length=100, db_index=True)
     authors = models.ManyToManyField(Author)
     publisher = models.ForeignKey(Publisher)
-    publication_date = models.DateField(blank=True, null=True)
+    publication_date = models.DateField(blank=True, null=True,
+                                        db_index=True)
 
     def __str__(self):
         return self.title
+
+
+class BookDocument(models.Model):
+    # zdenormalizowany wiersz wyniku wyszukiwania - jedna tabela zamiast
+    # złączenia Book, Publisher i Author; utrzymywany przez books.signals,
+    # odbudowa: manage.py rebuild_book_documents
+    book = models.OneToOneField(Book, primary_key=True,
+                                related_name='document')
+    title = models.CharField(max_length=100)
+    authors = models.TextField(blank=True)
+    publisher = models.CharField(max_length=30)
+    year = models.PositiveSmallIntegerField(blank=True, null=True)
+    # tekst z books.search.normalise, ten sam co w indeksie fts
+    search_key = models.TextField()
+
+    def __str__(self):
+        return self.title
+
+    class Meta:
+        indexes = [
+            # stronicowanie wyników po (title, id)
+            models.Index(fields=['title', 'book']),
+        ]
+
+
+class CatalogueStat(models.Model):
+    # liczniki katalogu utrzymywane przez books.signals (books.stats);
+    # raport czyta gotowe wiersze zamiast GROUP BY po całym katalogu,
+    # uzgadnianie: manage.py reconcile_catalogue_stats
+    DIMENSIONS = (
+        ('total', 'all books'),
+        ('publisher', 'books per publisher'),
+        ('year', 'books per publication year'),
+        ('author', 'books per author'),
+        ('country', 'books per publisher country'),
+        ('city', 'books per publisher city'),
+    )
+
+    dimension = models.CharField(max_length=10, choices=DIMENSIONS)
+    # id wydawcy lub autora, rok, kraj, miasto; '' - brak wartości
+    key = models.CharField(max_length=60, blank=True)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.dimension} {self.key}: {self.count}'
+
+    class Meta:
+        unique_together = [('dimension', 'key')]
+        indexes = [
+            # największe liczniki danego wymiaru
+            models.Index(fields=['dimension', 'count']),
+        ]
+
+
+class CatalogueVersion(models.Model):
+    # jeden wiersz; token zmienia się przy każdej zmianie katalogu
+    # (books.cache.bump_catalogue_version) i jest kopiowany do replik
+    # razem z danymi, więc ETag stron zgadza się z bazą, z której czytają
+    token = models.CharField(max_length=32)
+
+    def __str__(self):
+        return self.token
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _key(queryset):
+    # wyniki z rankingiem (books.search) - po (rank, id), inne po (title, id)
+    return 'rank' if 'rank' in queryset.query.extra_select else 'title'
+
+
+def encode_cursor(book, key='title'):
+    raw = json.dumps([getattr(book, key), book.pk]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(token, key='title'):
+    # zepsuty kursor albo kursor innego porządku traktujemy jak jego brak -
+    # wracamy na pierwszą stronę
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (binascii.Error, ValueError, TypeError, UnicodeError):
+        return None
+    types = (int, float) if key == 'rank' else str
+    if (not isinstance(value, types) or isinstance(value, bool) or
+            not isinstance(pk, int)):
+        return None
+    return value, pk
+
+
+def _seek(queryset, key, value, pk, op):
+    if key == 'title':
+        lookup = 'gt' if op == '>' else 'lt'
+        return queryset.filter(Q(**{f'title__{lookup}': value}) |
+                               Q(title=value, **{f'pk__{lookup}': pk}))
+    # rank to wyrażenie z extra(select=...), filter() go nie zna
+    sql, params = queryset.query.extra[key]
+    opts = queryset.model._meta
+    return queryset.extra(
+        where=[f'(({sql}), {opts.db_table}.{opts.pk.column}) {op} (%s, %s)'],
+        params=[*params, value, pk])
+
+
+def page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor=None, prev_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def paginate(queryset, after=None, before=None, size=PAGE_SIZE):
+    # seek po (title, id) albo (rank, id) zamiast OFFSET - koszt strony
+    # nie rośnie wraz z jej numerem
+    key = _key(queryset)
+    after = decode_cursor(after, key) if after else None
+    before = decode_cursor(before, key) if before else None
+
+    if before:
+        queryset = _seek(queryset, key, *before, '<')
+        rows = list(queryset.order_by(f'-{key}', '-pk')[:size + 1])
+        has_more = len(rows) > size
+        rows = rows[:size][::-1]
+        next_cursor = encode_cursor(rows[-1], key) if rows else None
+        prev_cursor = encode_cursor(rows[0], key) if has_more else None
+        return KeysetPage(rows, next_cursor, prev_cursor)
+
+    if after:
+        queryset = _seek(queryset, key, *after, '>')
+    rows = list(queryset.order_by(key, 'pk')[:size + 1])
+    has_more = len(rows) > size
+    rows = rows[:size]
+    next_cursor = encode_cursor(rows[-1], key) if has_more else None
+    prev_cursor = encode_cursor(rows[0], key) if after and rows else None
+    return KeysetPage(rows, next_cursor, prev_cursor)
@@ -0,0 +1,111 @@
+from django import forms
+from django.db import connections
+from django.db.models import Q
+from django.http import JsonResponse
+
+from .models import Author, Publisher
+from .pagination import page_size
+
+# dalej nie przewijamy - trzeba zawęzić prefiks
+MAX_PAGE = 50
+
+
+# w sqlite LIKE z parametrem nie korzysta z indeksu, zakres na kolumnie
+# z porównaniem NOCASE tak (indeksy z migracji 0009); górna granica to
+# prefiks z największym znakiem unicode
+NAME_PREFIX_SQL = (
+    '({table}.first_name COLLATE NOCASE >= %s AND '
+    '{table}.first_name COLLATE NOCASE < %s) OR '
+    '({table}.last_name COLLATE NOCASE >= %s AND '
+    '{table}.last_name COLLATE NOCASE < %s)'
+).format(table=Author._meta.db_table)
+
+
+def filter_name_prefix(queryset, word):
+    # word to początek imienia albo nazwiska, bez względu na wielkość liter
+    if connections[queryset.db].vendor != 'sqlite':
+        return queryset.filter(Q(first_name__istartswith=word) |
+                               Q(last_name__istartswith=word))
+    return queryset.extra(where=[NAME_PREFIX_SQL],
+                          params=[word, word + '\U0010ffff'] * 2)
+
+
+def _page(request):
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 1
+    return max(1, min(page, MAX_PAGE)), page_size(request.GET.get('size'))
+
+
+def author_choices(q, page, size):
+    # prosto z bazy, jak wyszukiwarka AuthorAdmin - każde słowo to początek
+    # imienia albo nazwiska; kolejni autorzy po indeksie
+    # (last_name, first_name)
+    end = page * size
+    authors = Author.objects.only('first_name', 'last_name')
+    for word in q.split():
+        authors = filter_name_prefix(authors, word)
+    authors = authors.order_by('last_name', 'first_name', 'pk')
+    rows = [(author.pk, str(author))
+            for author in authors[end - size:end + 1]]
+    return rows[:size], len(rows) > size
+
+
+def publisher_choices(q, page, size):
+    end = page * size
+    publishers = Publisher.objects.only('name').order_by('name', 'pk')
+    if q.strip():
+        publishers = publishers.filter(name__istartswith=q.strip())
+    rows = [(publisher.pk, publisher.name)
+            for publisher in publishers[end - size:end + 1]]
+    return rows[:size], len(rows) > size
+
+
+def lookup_view(choices):
+    def view(request):
+        q = request.GET.get('q', '')[:40]
+        page, size = _page(request)
+        rows, more = choices(q, page, size)
+        return JsonResponse({
+            'query': q,
+            'results': [{'id': pk, 'label': label} for pk, label in rows],
+            'next': page + 1 if more and page < MAX_PAGE else None,
+        })
+    return view
+
+
+class PickerMixin:
+    # renderujemy tylko wybrane obiekty, resztę dociąga skrypt z lookup_url
+    # stronami - strona edycji nie rośnie razem z tabelą; walidacja
+    # ModelChoiceField i tak pyta tylko o przesłane id
+    template_name = 'books/widgets/picker.html'
+
+    class Media:
+        js = ('books/picker.js',)
+
+    def __init__(self, lookup_url, attrs=None):
+        super().__init__(attrs)
+        self.lookup_url = lookup_url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['lookup_url'] = str(self.lookup_url)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        selected = [v for v in value if v]
+        queryset = self.choices.queryset.filter(pk__in=selected) \
+            if selected else []
+        options = [self.create_option(name, obj.pk, str(obj), True, index,
+                                      attrs=attrs)
+                   for index, obj in enumerate(queryset)]
+        return [(None, options, 0)]
+
+
+class AuthorPicker(PickerMixin, forms.SelectMultiple):
+    pass
+
+
+class PublisherPicker(PickerMixin, forms.Select):
+    pass
@@ -0,0 +1,39 @@
+from django.db import connections, transaction
+
+from . import search
+from .models import (Author, Book, BookDocument, CatalogueStat,
+                     CatalogueVersion, Publisher)
+
+
+def tables():
+    return [Publisher._meta.db_table,
+            Author._meta.db_table,
+            Book._meta.db_table,
+            Book.authors.through._meta.db_table,
+            BookDocument._meta.db_table,
+            CatalogueStat._meta.db_table,
+            CatalogueVersion._meta.db_table]
+
+
+def replicate(target, using='default'):
+    # zastępstwo replikacji dla dwóch plików sqlite: kopia tabel books
+    # z bazy głównej do pliku repliki w jednej transakcji
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute('ATTACH DATABASE %s AS replica', [target])
+        try:
+            with transaction.atomic(using=using):
+                for table in tables():
+                    cursor.execute(f'DELETE FROM replica.{table}')
+                    cursor.execute(f'INSERT INTO replica.{table} '
+                                   f'SELECT * FROM main.{table}')
+                if search.is_supported(using):
+                    fts = search.FTS_TABLE
+                    cursor.execute(f'DELETE FROM replica.{fts}')
+                    cursor.execute(
+                        f'INSERT INTO replica.{fts} '
+                        f'(rowid, title, authors, publisher) '
+                        f'SELECT rowid, title, authors, publisher '
+                        f'FROM main.{fts}')
+        finally:
+            cursor.execute('DETACH DATABASE replica')
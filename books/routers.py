@@ -0,0 +1,57 @@
+import random
+import threading
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+_state = threading.local()
+
+
+def pin():
+    # ten wątek (request) czyta tylko z bazy głównej
+    _state.pinned = True
+
+
+def reset():
+    _state.pinned = False
+    _state.wrote = False
+    _state.replica = None
+
+
+def wrote():
+    return getattr(_state, 'wrote', False)
+
+
+class ReplicaRouter:
+    # odczyty modeli books idą do replik z BOOKS_READ_REPLICAS,
+    # zapisy do bazy głównej
+
+    app_label = 'books'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        replicas = getattr(settings, 'BOOKS_READ_REPLICAS', [])
+        if not replicas or getattr(_state, 'pinned', False):
+            return PRIMARY
+        # jedna replika na request - wersja katalogu (ETag) i dane strony
+        # pochodzą z tej samej kopii, nawet jeśli repliki są w różnym stanie
+        replica = getattr(_state, 'replica', None)
+        if replica not in replicas:
+            replica = _state.replica = random.choice(replicas)
+        return replica
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        # bez jawnego aliasu django zapisałby obiekt tam,
+        # skąd został odczytany, czyli do repliki
+        _state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {PRIMARY, *getattr(settings, 'BOOKS_READ_REPLICAS', [])}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
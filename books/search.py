@@ -0,0 +1,182 @@
+import re
+import unicodedata
+
+from django.db import connections, router
+from django.db.models import Q
+
+from .models import Book, BookDocument
+
+FTS_TABLE = 'books_book_fts'
+
+# waga kolumn dla bm25(): title, authors, publisher
+RANK_WEIGHTS = (10.0, 3.0, 1.0)
+
+REBUILD_CHUNK_SIZE = 500
+
+# litery, których NFKD nie rozkłada na literę bazową i znak diakrytyczny
+LETTERS = str.maketrans({'ł': 'l', 'Ł': 'L', 'ø': 'o', 'Ø': 'O',
+                         'đ': 'd', 'Đ': 'D', 'ı': 'i'})
+
+
+def normalise(text):
+    # małe litery, bez znaków diakrytycznych;
+    # do indeksu fts5 trafia już znormalizowany tekst
+    text = unicodedata.normalize('NFKD', text.translate(LETTERS))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.casefold().split())
+
+
+def query_terms(q):
+    # słowa tak jak dzieli je tokenizer unicode61 w fts5 - podkreślenie
+    # jest separatorem; na tym samym podziale opiera się unieważnianie
+    # books.cache
+    return re.findall(r'[^\W_]+', normalise(q))
+
+
+def match_expression(q):
+    # każde słowo zapytania jako prefiks, słowa łączone przez AND
+    return ' '.join(f'"{term}"*' for term in query_terms(q))
+
+
+def is_supported(using):
+    return connections[using].vendor == 'sqlite'
+
+
+def search_books(q, queryset=None, ranked=True):
+    if queryset is None:
+        queryset = Book.objects.all()
+
+    expr = match_expression(q)
+    if not expr:
+        return queryset.none()
+
+    if not is_supported(queryset.db):
+        # inne bazy nie mają fts5, zostaje skanowanie z LIKE
+        if queryset.model is BookDocument:
+            return queryset.filter(
+                book__in=search_books(q, ranked=False).values('pk'))
+        return queryset.filter(
+            Q(title__icontains=q) |
+            Q(authors__first_name__icontains=q) |
+            Q(authors__last_name__icontains=q) |
+            Q(publisher__name__icontains=q)).distinct()
+
+    # Book albo BookDocument - klucz obu to id książki, czyli rowid w fts
+    opts = queryset.model._meta
+    pk = f'{opts.db_table}.{opts.pk.column}'
+    if not ranked:
+        return queryset.extra(
+            where=[f'{pk} IN (SELECT rowid FROM {FTS_TABLE} '
+                   f'WHERE {FTS_TABLE} MATCH %s)'],
+            params=[expr])
+
+    # złączenie z fts zamiast podzapytania dla każdego wiersza -
+    # bm25 liczone raz na trafienie, także w warunku kursora
+    # (books.pagination)
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {pk}', f'{FTS_TABLE} MATCH %s'],
+        params=[expr],
+        select={'rank': f'bm25({FTS_TABLE}, {weights})'},
+        order_by=['rank', 'title'])
+
+
+def search_hits(q):
+    # wszystko, czego potrzebuje szablon wyników, z jednej tabeli,
+    # w kolejności bm25 (strony po kursorze (rank, id))
+    return search_books(q, queryset=BookDocument.objects.all())
+
+
+def hits_in_order(book_ids):
+    # strona z cache - te same książki, bez ponownego MATCH
+    hits = BookDocument.objects.in_bulk(book_ids)
+    return [hits[pk] for pk in book_ids if pk in hits]
+
+
+def count_books(q):
+    return search_books(q, ranked=False).count()
+
+
+def book_rows(book_ids, using):
+    # (pk, tytuł, lista autorów, wydawca, data wydania) - values_list
+    # zamiast instancji z prefetch_related, przy imporcie
+    # przetwarzamy tysiące książek naraz
+    authors = {}
+    for book_id, first_name, last_name in (
+            Book.authors.through.objects.using(using)
+            .filter(book_id__in=book_ids)
+            .order_by('pk')
+            .values_list('book_id', 'author__first_name',
+                         'author__last_name')):
+        authors.setdefault(book_id, []).append(f'{first_name} {last_name}')
+    return [(pk, title, authors.get(pk, []), publisher, publication_date)
+            for pk, title, publisher, publication_date in (
+                Book.objects.using(using)
+                .filter(pk__in=book_ids)
+                .values_list('pk', 'title', 'publisher__name',
+                             'publication_date'))]
+
+
+def index_books(book_ids, using=None, rows=None):
+    book_ids = list(book_ids)
+    if using is None:
+        using = router.db_for_write(Book)
+    if not book_ids or not is_supported(using):
+        return
+
+    if rows is None:
+        rows = book_rows(book_ids, using)
+    rows = [(pk, normalise(title), normalise(' '.join(authors)),
+             normalise(publisher))
+            for pk, title, authors, publisher, _ in rows]
+
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [(pk,) for pk in book_ids])
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, authors, publisher) '
+            f'VALUES (%s, %s, %s, %s)', rows)
+
+
+def unindex_books(book_ids, using=None):
+    if using is None:
+        using = router.db_for_write(Book)
+    if not is_supported(using):
+        return
+
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [(pk,) for pk in book_ids])
+
+
+def indexed_texts(book_ids, using=None):
+    # treść dokumentów w indeksie - przed zmianą to jedyne miejsce,
+    # gdzie jest jeszcze np. stare nazwisko autora
+    if using is None:
+        using = router.db_for_write(Book)
+    if not is_supported(using):
+        return None
+
+    book_ids = list(book_ids)
+    if not book_ids:
+        return []
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT title || ' ' || authors || ' ' || publisher "
+            f"FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", book_ids)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def rebuild_index(using=None):
+    if using is None:
+        using = router.db_for_write(Book)
+    if not is_supported(using):
+        return
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    book_ids = list(Book.objects.using(using).values_list('pk', flat=True))
+    for start in range(0, len(book_ids), REBUILD_CHUNK_SIZE):
+        index_books(book_ids[start:start + REBUILD_CHUNK_SIZE], using=using)
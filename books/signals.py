@@ -0,0 +1,163 @@
+from collections import Counter
+
+from django.db import router
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+
+from . import cache as search_cache
+from . import documents, search, stats, typeahead
+from .models import Author, Book, Publisher
+
+# limit zmiennych w jednym zapytaniu sqlite
+CHUNK_SIZE = 500
+
+
+def _chunks(book_ids):
+    book_ids = list(book_ids)
+    for start in range(0, len(book_ids), CHUNK_SIZE):
+        yield book_ids[start:start + CHUNK_SIZE]
+
+
+def books_changed(book_ids, using=None):
+    if using is None:
+        using = router.db_for_write(Book)
+    for chunk in _chunks(book_ids):
+        # te same wiersze dla indeksu fts i tabeli BookDocument
+        rows = search.book_rows(chunk, using)
+        before = search.indexed_texts(chunk, using=using)
+        search.index_books(chunk, using=using, rows=rows)
+        documents.update_documents(chunk, using=using, rows=rows)
+        after = search.indexed_texts(chunk, using=using)
+        search_cache.invalidate(None if before is None else before + after)
+    return search_cache.bump_catalogue_version(using)
+
+
+def books_removed(book_ids, using=None):
+    # wiersze BookDocument usuwa kaskada razem z książką
+    for chunk in _chunks(book_ids):
+        before = search.indexed_texts(chunk, using=using)
+        search.unindex_books(chunk, using=using)
+        search_cache.invalidate(before)
+    return search_cache.bump_catalogue_version(using)
+
+
+def _books(book_ids, using):
+    return Book.objects.using(using).filter(pk__in=list(book_ids))
+
+
+# raw - zapis z loaddata: powiązane wiersze mogą jeszcze nie istnieć,
+# więc receivery zapisu nic nie robią; po wczytaniu fixture indeks,
+# dokumenty i liczniki odbudowują rebuild_book_documents
+# i reconcile_catalogue_stats
+
+@receiver(pre_save, sender=Book)
+def book_saving(sender, instance, using, **kwargs):
+    if kwargs.get('raw'):
+        return
+    # liczniki books.stats zmieniamy o różnicę stanu przed i po zapisie
+    instance._stats_before = Counter() if instance._state.adding else \
+        stats.contributions(_books([instance.pk], using), authors=False)
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, using, **kwargs):
+    if kwargs.get('raw'):
+        return
+    after = stats.contributions(_books([instance.pk], using), authors=False)
+    stats.apply(stats.difference(after, instance._stats_before), using=using)
+    # indeks typeahead przed nową wersją katalogu, patrz typeahead.follow
+    typeahead.update_book(instance)
+    typeahead.follow(books_changed([instance.pk], using=using))
+
+
+@receiver(pre_delete, sender=Book)
+def book_deleting(sender, instance, using, **kwargs):
+    # wiersze tabeli pośredniej usuwa kaskada, bez m2m_changed
+    instance._stats_before = stats.contributions(_books([instance.pk], using))
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, using, **kwargs):
+    stats.apply(stats.difference({}, getattr(instance, '_stats_before', {})),
+                using=using)
+    typeahead.remove('title', instance.pk)
+    typeahead.follow(books_removed([instance.pk], using=using))
+
+
+@receiver(post_save, sender=Author)
+def author_saved(sender, instance, using, **kwargs):
+    if kwargs.get('raw'):
+        return
+    typeahead.update_author(instance)
+    typeahead.follow(books_changed(
+        instance.book_set.using(using).values_list('pk', flat=True),
+        using=using))
+
+
+@receiver(pre_delete, sender=Author)
+def author_deleting(sender, instance, using, **kwargs):
+    # po usunięciu autora nie ma już wierszy w tabeli pośredniej
+    instance._affected_book_ids = list(
+        instance.book_set.using(using).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Author)
+def author_deleted(sender, instance, using, **kwargs):
+    book_ids = getattr(instance, '_affected_book_ids', [])
+    stats.apply({('author', str(instance.pk)): -len(book_ids)}, using=using)
+    typeahead.remove('author', instance.pk)
+    typeahead.follow(books_changed(book_ids, using=using))
+
+
+@receiver(pre_save, sender=Publisher)
+def publisher_saving(sender, instance, using, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if not instance._state.adding:
+        instance._stats_place = (
+            Publisher.objects.using(using).filter(pk=instance.pk)
+            .values_list('country', 'city').first())
+
+
+@receiver(post_save, sender=Publisher)
+def publisher_saved(sender, instance, using, **kwargs):
+    if kwargs.get('raw'):
+        return
+    # książki wydawcy przechodzą do liczników nowego kraju i miasta
+    before = getattr(instance, '_stats_place', None)
+    if before and before != (instance.country, instance.city):
+        n = instance.book_set.using(using).count()
+        stats.apply(stats.difference(
+            {('country', instance.country): n, ('city', instance.city): n},
+            {('country', before[0]): n, ('city', before[1]): n}),
+            using=using)
+    # wydawca nie ma wpisów w indeksie typeahead
+    typeahead.follow(books_changed(
+        instance.book_set.using(using).values_list('pk', flat=True),
+        using=using))
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def book_authors_changed(sender, instance, action, reverse, pk_set, using,
+                         **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._affected_book_ids = list(
+            instance.book_set.using(using).values_list('pk', flat=True))
+
+    if not reverse:
+        book_ids = [instance.pk]
+    elif action in ('pre_clear', 'post_clear'):
+        book_ids = getattr(instance, '_affected_book_ids', [])
+    else:
+        book_ids = pk_set
+
+    if action in ('pre_add', 'pre_remove', 'pre_clear'):
+        instance._stats_before = stats.author_contributions(
+            _books(book_ids, using))
+        return
+
+    after = stats.author_contributions(_books(book_ids, using))
+    stats.apply(stats.difference(after, getattr(instance, '_stats_before',
+                                                {})), using=using)
+    typeahead.follow(books_changed(book_ids, using=using))
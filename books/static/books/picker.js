@@ -0,0 +1,93 @@
+// wybór autorów i wydawcy w BookAdmin: strony wyników z lookup url
+// (?q=prefiks&page=n), w <select> tylko wybrane obiekty
+(function () {
+    'use strict';
+
+    function init(root) {
+        var url = root.getAttribute('data-lookup-url');
+        var search = root.querySelector('.books-picker-search');
+        var list = root.querySelector('.books-picker-results');
+        var more = root.querySelector('.books-picker-more');
+        var select = root.querySelector('select');
+        var next = null;
+        var timer = null;
+        var request = 0;
+
+        function choose(item) {
+            var value = String(item.id);
+            for (var i = 0; i < select.options.length; i++) {
+                if (select.options[i].value === value) {
+                    select.options[i].selected = true;
+                    return;
+                }
+            }
+            if (!select.multiple) {
+                select.innerHTML = '';
+            }
+            select.add(new Option(item.label, value, true, true));
+        }
+
+        function load(page, append) {
+            var current = ++request;
+            var query = '?q=' + encodeURIComponent(search.value) +
+                '&page=' + page;
+            fetch(url + query, {credentials: 'same-origin'})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    // odpowiedź na starsze zapytanie - pomijamy
+                    if (current !== request) {
+                        return;
+                    }
+                    if (!append) {
+                        list.innerHTML = '';
+                    }
+                    data.results.forEach(function (item) {
+                        var li = document.createElement('li');
+                        var link = document.createElement('a');
+                        link.href = '#';
+                        link.textContent = item.label;
+                        link.addEventListener('click', function (event) {
+                            event.preventDefault();
+                            choose(item);
+                        });
+                        li.appendChild(link);
+                        list.appendChild(li);
+                    });
+                    next = data.next;
+                    more.hidden = next === null;
+                });
+        }
+
+        search.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { load(1, false); }, 250);
+        });
+        more.addEventListener('click', function () {
+            if (next !== null) {
+                load(next, true);
+            }
+        });
+        // podwójne kliknięcie usuwa autora z wyboru
+        select.addEventListener('dblclick', function (event) {
+            if (select.multiple && event.target.tagName === 'OPTION') {
+                select.removeChild(event.target);
+            }
+        });
+        // jak w filter_horizontal: wysyłamy wszystkie pozostawione
+        // opcje, niezależnie od zaznaczenia
+        if (select.multiple && select.form) {
+            select.form.addEventListener('submit', function () {
+                for (var i = 0; i < select.options.length; i++) {
+                    select.options[i].selected = true;
+                }
+            });
+        }
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var roots = document.querySelectorAll('.books-picker');
+        for (var i = 0; i < roots.length; i++) {
+            init(roots[i]);
+        }
+    });
+})();
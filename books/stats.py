@@ -0,0 +1,98 @@
+from collections import Counter
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F
+from django.db.models.functions import ExtractYear, Greatest
+
+from .models import Book, CatalogueStat
+
+DIMENSIONS = [dimension for dimension, _ in CatalogueStat.DIMENSIONS]
+
+
+def contributions(books, authors=True):
+    # ile książek z books trafia do każdego licznika (wymiar, klucz);
+    # dwa zapytania GROUP BY po wybranych książkach, nie po katalogu
+    counts = Counter()
+    rows = (books.order_by()
+            .annotate(year=ExtractYear('publication_date'))
+            .values_list('publisher', 'year', 'publisher__country',
+                         'publisher__city')
+            .annotate(n=Count('pk')))
+    for publisher, year, country, city, n in rows:
+        counts[('total', '')] += n
+        counts[('publisher', str(publisher))] += n
+        counts[('year', '' if year is None else str(year))] += n
+        counts[('country', country)] += n
+        counts[('city', city)] += n
+    if authors:
+        counts.update(author_contributions(books))
+    return counts
+
+
+def author_contributions(books):
+    through = books.model.authors.through.objects.using(books.db)
+    rows = (through.filter(book__in=books.values('pk'))
+            .order_by()
+            .values_list('author')
+            .annotate(n=Count('book')))
+    return Counter({('author', str(author)): n for author, n in rows})
+
+
+def difference(after, before):
+    # Counter.__sub__ gubi wartości ujemne
+    delta = Counter(after)
+    delta.subtract(before)
+    return delta
+
+
+def apply(delta, using=None):
+    if using is None:
+        using = router.db_for_write(CatalogueStat)
+    stats = CatalogueStat.objects.using(using)
+    for (dimension, key), n in sorted(delta.items()):
+        if not n:
+            continue
+        row = stats.filter(dimension=dimension, key=key)
+        # licznik nie schodzi poniżej zera, rozjazd poprawi uzgadnianie
+        if row.update(count=Greatest(F('count') + n, 0)):
+            if n < 0:
+                row.filter(count=0).delete()
+        elif n > 0:
+            try:
+                with transaction.atomic(using=using):
+                    stats.create(dimension=dimension, key=key, count=n)
+            except IntegrityError:
+                # równoległy zapis utworzył wiersz pierwszy
+                row.update(count=F('count') + n)
+
+
+def rows(dimension, limit=None, using=None):
+    # największe liczniki wymiaru, po indeksie (dimension, count)
+    stats = (CatalogueStat.objects.using(using)
+             .filter(dimension=dimension, count__gt=0)
+             .order_by('-count', 'key')
+             .values_list('key', 'count'))
+    return list(stats[:limit] if limit else stats)
+
+
+def total(using=None):
+    return dict(rows('total', using=using)).get('', 0)
+
+
+def reconcile(using=None, dry_run=False):
+    # przeliczenie od zera i poprawienie rozbieżnych wierszy;
+    # zwraca liczbę poprawionych liczników
+    if using is None:
+        using = router.db_for_write(CatalogueStat)
+    expected = contributions(Book.objects.using(using).all())
+    stats = CatalogueStat.objects.using(using)
+    current = {(dimension, key): count for dimension, key, count
+               in stats.values_list('dimension', 'key', 'count')}
+    delta = {key: expected[key] - current.get(key, 0)
+             for key in set(expected) | set(current)}
+    delta = {key: n for key, n in delta.items() if n}
+    if delta and not dry_run:
+        with transaction.atomic(using=using):
+            stats.filter(count=0).delete()
+            apply(delta, using=using)
+    return len(delta)
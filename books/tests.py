@@ -1,3 +1,1191 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core import serializers
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Min
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import (
+    RequestFactory, TestCase, TransactionTestCase, override_settings,
+)
+
+from contact.models import OutgoingMessage
+from master import cache as master_cache
+from master import ratelimit, singleflight
+
+from . import cache as search_cache
+from . import routers, stats, typeahead
+from .admin import filter_name_prefix
+from .bulk import STREAM_BUFFER_SIZE, Importer, export_rows, read_rows
+from .middleware import PINNED_COOKIE, ReplicaPinningMiddleware
+from .models import (Author, Book, BookDocument, CatalogueStat,
+                     CatalogueVersion, Publisher)
+from .pagination import decode_cursor, encode_cursor, paginate
+from .replication import replicate
+from .search import search_books
+
+
+def clear_caches():
+    for alias in ('default', search_cache.CACHE_ALIAS, 'pages'):
+        caches[alias].clear()
+
+
+class BookSearchTests(TestCase):
+    def setUp(self):
+        self.publisher = Publisher.objects.create(
+            name="O'Reilly", address='1005 Gravenstein Highway North',
+            city='Sebastopol', state_province='CA', country='U.S.A.',
+            website='http://www.oreilly.com/')
+        self.author = Author.objects.create(first_name='Adrian',
+                                            last_name='Holovaty')
+        self.book = Book.objects.create(title='The Django Book',
+                                        publisher=self.publisher,
+                                        publication_date=date(2009, 1, 1))
+        self.book.authors.add(self.author)
+
+    def titles(self, q):
+        return [book.title for book in search_books(q)]
+
+    def test_matches_title_prefix(self):
+        self.assertEqual(self.titles('djan'), ['The Django Book'])
+        self.assertEqual(self.titles('flask'), [])
+
+    def test_matches_author_and_publisher(self):
+        self.assertEqual(self.titles('holovaty'), ['The Django Book'])
+        self.assertEqual(self.titles('reilly'), ['The Django Book'])
+
+    def test_ignores_case_and_diacritics(self):
+        Book.objects.create(title='Zażółć gęślą jaźń',
+                            publisher=self.publisher)
+        self.assertEqual(self.titles('GESLA'), ['Zażółć gęślą jaźń'])
+        self.assertEqual(self.titles('zazolc'), ['Zażółć gęślą jaźń'])
+
+    def test_title_matches_rank_first(self):
+        other = Author.objects.create(first_name='Django', last_name='Fan')
+        book = Book.objects.create(title='Web Frameworks',
+                                   publisher=self.publisher)
+        book.authors.add(other)
+        self.assertEqual(self.titles('django'),
+                         ['The Django Book', 'Web Frameworks'])
+
+    def test_index_follows_changes(self):
+        self.author.last_name = 'Kaplan-Moss'
+        self.author.save()
+        self.assertEqual(self.titles('holovaty'), [])
+        self.assertEqual(self.titles('kaplan'), ['The Django Book'])
+
+        self.book.authors.clear()
+        self.assertEqual(self.titles('kaplan'), [])
+
+        self.author.book_set.add(self.book)
+        self.assertEqual(self.titles('kaplan'), ['The Django Book'])
+
+        self.author.delete()
+        self.assertEqual(self.titles('kaplan'), [])
+
+        self.book.delete()
+        self.assertEqual(self.titles('django'), [])
+
+    def test_view_renders_hits(self):
+        response = self.client.get('/books/search/', {'q': 'django'})
+        self.assertContains(response, 'The Django Book')
+
+
+class BookSearchPaginationTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.publisher = Publisher.objects.create(
+            name='Apress', address='2855 Telegraph Avenue', city='Berkeley',
+            state_province='CA', country='U.S.A.',
+            website='http://www.apress.com/')
+        for title in ['Python %02d' % n for n in range(25)]:
+            Book.objects.create(title=title, publisher=self.publisher)
+
+    def test_pages_walk_forward_and_back(self):
+        books = search_books('python', ranked=False)
+        first = paginate(books, size=10)
+        self.assertEqual([b.title for b in first][:2],
+                         ['Python 00', 'Python 01'])
+        self.assertIsNone(first.prev_cursor)
+
+        second = paginate(books, after=first.next_cursor, size=10)
+        self.assertEqual(second.object_list[0].title, 'Python 10')
+
+        third = paginate(books, after=second.next_cursor, size=10)
+        self.assertEqual(len(third), 5)
+        self.assertIsNone(third.next_cursor)
+
+        back = paginate(books, before=third.prev_cursor, size=10)
+        self.assertEqual([b.pk for b in back], [b.pk for b in second])
+
+    def test_ranked_pages_walk_forward_and_back(self):
+        # krótszy tytuł - wyższy bm25
+        Book.objects.create(title='Python', publisher=self.publisher)
+        books = search_books('python')
+        ranked = [b.pk for b in books]
+        first = paginate(books, size=10)
+        self.assertEqual(first.object_list[0].title, 'Python')
+        second = paginate(books, after=first.next_cursor, size=10)
+        third = paginate(books, after=second.next_cursor, size=10)
+        self.assertEqual([b.pk for b in [*first, *second, *third]], ranked)
+        self.assertIsNone(third.next_cursor)
+
+        back = paginate(books, before=third.prev_cursor, size=10)
+        self.assertEqual([b.pk for b in back], [b.pk for b in second])
+        # kursor tytułu nie pasuje do porządku po rank
+        self.assertEqual(
+            [b.pk for b in paginate(
+                books, after=encode_cursor(first.object_list[0]), size=10)],
+            [b.pk for b in first])
+
+    def test_broken_cursor_starts_from_first_page(self):
+        self.assertIsNone(decode_cursor('not a cursor'))
+        page = paginate(search_books('python', ranked=False), after='%%%')
+        self.assertEqual(page.object_list[0].title, 'Python 00')
+
+    def test_view_bounds_page_size(self):
+        response = self.client.get('/books/search/',
+                                   {'q': 'python', 'size': 1000})
+        self.assertContains(response, 'Found <em>25</em> books')
+        self.assertEqual(len(response.context['page']), 25)
+
+        response = self.client.get('/books/search/',
+                                   {'q': 'python', 'size': 5})
+        self.assertEqual(len(response.context['page']), 5)
+        self.assertContains(response, 'after=')
+
+
+class BookSearchQueryCountTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        publisher = Publisher.objects.create(
+            name='Manning', address='20 Baldwin Road', city='Shelter Island',
+            state_province='NY', country='U.S.A.',
+            website='https://www.manning.com/')
+        authors = [Author.objects.create(first_name='Author', last_name=str(n))
+                   for n in range(3)]
+        for n in range(30):
+            book = Book.objects.create(title='Django %02d' % n,
+                                       publisher=publisher,
+                                       publication_date=date(2017, 1, 1))
+            book.authors.add(*authors[:n % 3 + 1])
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        # wersja katalogu (ETag), count (pierwsze wywołanie),
+        # strona z tabeli BookDocument
+        with self.assertNumQueries(3):
+            self.client.get('/books/search/', {'q': 'django', 'size': 5})
+
+        # count jest już w cache
+        with self.assertNumQueries(2):
+            response = self.client.get('/books/search/',
+                                       {'q': 'django', 'size': 30})
+        self.assertContains(response, 'by Author 0, Author 1')
+        self.assertContains(response, 'Manning')
+
+
+class BookSearchCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.publisher = Publisher.objects.create(
+            name='No Starch Press', address='245 8th Street',
+            city='San Francisco', state_province='CA', country='U.S.A.',
+            website='https://nostarch.com/')
+        self.book = Book.objects.create(title='Automate the Boring Stuff',
+                                        publisher=self.publisher)
+        Book.objects.create(title='Black Hat Python',
+                            publisher=self.publisher)
+
+    def search(self, q):
+        return [str(b) for b in self.client.get(
+            '/books/search/', {'q': q}).context['page']]
+
+    def test_repeated_query_is_served_from_cache(self):
+        self.search('automate')
+        stats = search_cache.stats()
+        with self.assertNumQueries(2):
+            self.assertEqual(self.search('Automate '),
+                             ['Automate the Boring Stuff'])
+        self.assertEqual(search_cache.stats()['hits'], stats['hits'] + 2)
+
+    def test_only_matching_queries_are_invalidated(self):
+        self.search('automate')
+        self.search('python')
+        invalidations = search_cache.stats()['invalidations']
+
+        self.book.title = 'Automate the Boring Stuff, 2nd Edition'
+        self.book.save()
+        self.assertEqual(search_cache.stats()['invalidations'],
+                         invalidations + 1)
+        self.assertEqual(self.search('automate'),
+                         ['Automate the Boring Stuff, 2nd Edition'])
+        hits = search_cache.stats()['hits']
+        self.search('python')
+        self.assertEqual(search_cache.stats()['hits'], hits + 2)
+
+        Book.objects.create(title='Python Crash Course',
+                            publisher=self.publisher)
+        self.assertEqual(self.search('python'),
+                         ['Black Hat Python', 'Python Crash Course'])
+
+    def test_stats_endpoint(self):
+        self.search('python')
+        response = self.client.get('/books/search/cache/')
+        self.assertEqual(response.json()['misses'] >= 2, True)
+        response = self.client.get('/books/search/cache/',
+                                   REMOTE_ADDR='203.0.113.5')
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_change_invalidates_everything(self):
+        search_cache.set_results('python', 'count', 1)
+        search_cache.set_results('automate', 'count', 1)
+        search_cache.invalidate(['Black Hat Python'])
+        self.assertIsNone(search_cache.get_results('python', 'count'))
+        self.assertEqual(search_cache.get_results('automate', 'count'), 1)
+        search_cache.invalidate()
+        self.assertIsNone(search_cache.get_results('automate', 'count'))
+
+    def test_underscore_separates_words(self):
+        # fts5 (unicode61) dzieli web_dev na dwa słowa, cache też
+        Book.objects.create(title='Flask web_dev', publisher=self.publisher)
+        self.assertEqual(self.search('dev'), ['Flask web_dev'])
+        search_cache.set_results('dev', 'count', 1)
+        search_cache.invalidate(['Flask web_dev'])
+        self.assertIsNone(search_cache.get_results('dev', 'count'))
+
+    def test_long_words_share_a_version(self):
+        word = 'a' * search_cache.MAX_TERM_LENGTH
+        search_cache.set_results(word + 'bc', 'count', 1)
+        search_cache.invalidate([word + 'xyz'])
+        self.assertIsNone(search_cache.get_results(word + 'bc', 'count'))
+
+
+class BookDocumentTests(TestCase):
+    def setUp(self):
+        self.publisher = Publisher.objects.create(
+            name="O'Reilly", address='1005 Gravenstein Highway North',
+            city='Sebastopol', state_province='CA', country='U.S.A.',
+            website='https://www.oreilly.com/')
+        self.author = Author.objects.create(first_name='Paweł',
+                                            last_name='Kowalski')
+        self.book = Book.objects.create(title='Django Unleashed',
+                                        publisher=self.publisher,
+                                        publication_date=date(2015, 11, 1))
+        self.book.authors.add(self.author)
+
+    def document(self):
+        return BookDocument.objects.get(pk=self.book.pk)
+
+    def test_document_follows_book_and_relations(self):
+        document = self.document()
+        self.assertEqual(document.title, 'Django Unleashed')
+        self.assertEqual(document.authors, 'Paweł Kowalski')
+        self.assertEqual(document.publisher, "O'Reilly")
+        self.assertEqual(document.year, 2015)
+        self.assertEqual(document.search_key,
+                         "django unleashed pawel kowalski o'reilly")
+
+        self.book.authors.add(Author.objects.create(first_name='Adrian',
+                                                    last_name='Holovaty'))
+        self.assertEqual(self.document().authors,
+                         'Paweł Kowalski, Adrian Holovaty')
+
+        self.author.last_name = 'Nowak'
+        self.author.save()
+        self.assertEqual(self.document().authors,
+                         'Paweł Nowak, Adrian Holovaty')
+
+        self.publisher.name = 'Helion'
+        self.publisher.save()
+        self.assertEqual(self.document().publisher, 'Helion')
+
+        self.book.delete()
+        self.assertFalse(BookDocument.objects.exists())
+
+    def test_rebuild_command(self):
+        BookDocument.objects.all().delete()
+        out = io.StringIO()
+        call_command('rebuild_book_documents', stdout=out)
+        self.assertEqual(self.document().authors, 'Paweł Kowalski')
+        self.assertIn('Rebuilt 1 book documents.', out.getvalue())
+
+    def test_loaddata_skips_receivers_until_rebuild(self):
+        fixture = [
+            {'model': 'books.publisher', 'pk': 100,
+             'fields': {'name': 'Helion', 'address': '', 'city': 'Gliwice',
+                        'state_province': '', 'country': 'Poland',
+                        'website': 'https://helion.pl/'}},
+            {'model': 'books.book', 'pk': 100,
+             'fields': {'title': 'Fixture Python', 'publisher': 100,
+                        'publication_date': None, 'authors': []}},
+        ]
+        total = stats.total()
+        # jak loaddata (save_base(raw=True)), bez sprawdzania kluczy obcych,
+        # które w sqlite z django 1.11 trafia na tabele *__old z migracji
+        for obj in serializers.deserialize('json', json.dumps(fixture)):
+            obj.save()
+        self.assertEqual(stats.total(), total)
+        self.assertEqual(search_books('fixture').count(), 0)
+
+        call_command('rebuild_book_documents', stdout=io.StringIO())
+        call_command('reconcile_catalogue_stats', stdout=io.StringIO())
+        self.assertEqual([b.title for b in search_books('fixture')],
+                         ['Fixture Python'])
+        self.assertTrue(BookDocument.objects.filter(book_id=100).exists())
+        self.assertEqual(stats.total(), total + 1)
+
+    def test_admin_listing(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+        response = self.client.get('/admin/books/bookdocument/',
+                                   {'q': 'pawel'})
+        self.assertContains(response, 'Paweł Kowalski')
+        self.assertContains(response, f'/admin/books/book/{self.book.pk}/')
+
+    def test_search_reads_only_documents(self):
+        clear_caches()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/books/search/', {'q': 'kowalski'})
+        page = queries.captured_queries[1]['sql']
+        self.assertIn('"books_bookdocument"', page)
+        self.assertNotIn('"books_book"', page)
+        self.assertNotIn('JOIN', page)
+
+
+class BookSearchHttpCacheTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.publisher = Publisher.objects.create(
+            name='Apress', address='233 Spring Street', city='New York',
+            state_province='NY', country='U.S.A.',
+            website='https://www.apress.com/')
+        self.book = Book.objects.create(title='Pro Django',
+                                        publisher=self.publisher)
+
+    def search(self, **headers):
+        return self.client.get('/books/search/', {'q': 'django'}, **headers)
+
+    def test_conditional_get_skips_the_view(self):
+        response = self.search()
+        etag = response['ETag']
+        self.assertEqual(response['Cache-Control'], 'private, max-age=0')
+
+        # tylko wersja katalogu
+        with self.assertNumQueries(1):
+            response = self.search(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        self.book.title = 'Pro Django, 2nd edition'
+        self.book.save()
+        response = self.search(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, '2nd edition')
+
+    def test_anonymous_pages_are_cached(self):
+        self.search()
+        with self.assertNumQueries(1):
+            response = self.search()
+        self.assertContains(response, 'Pro Django')
+
+        # z sesją widok działa, wyniki wyszukiwania są już w cache
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'x'
+        with self.assertNumQueries(2):
+            self.search()
+
+
+class BookSearchWorkersTests(TransactionTestCase):
+    # dwa procesy serwera: wspólna baza, osobne cache w pamięci
+
+    def setUp(self):
+        clear_caches()
+        self.publisher = Publisher.objects.create(
+            name='Apress', address='233 Spring Street', city='New York',
+            state_province='NY', country='U.S.A.',
+            website='https://www.apress.com/')
+        Book.objects.create(title='Pro Django', publisher=self.publisher)
+
+    def in_other_worker(self, func):
+        # wątek z własnymi cache books-search i pages oraz stanem
+        # books.cache, czyli tym, czego procesy między sobą nie dzielą
+        def run():
+            try:
+                with mock.patch.object(master_cache, '_caches', {}), \
+                        mock.patch.object(search_cache, '_seen_version'):
+                    func()
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+    def search(self, **headers):
+        return self.client.get('/books/search/', {'q': 'django'}, **headers)
+
+    def test_write_in_other_worker_changes_etag_and_results(self):
+        response = self.search()
+        etag = response['ETag']
+        self.assertEqual(response.context['count'], 1)
+
+        self.in_other_worker(lambda: Book.objects.create(
+            title='Django Unleashed', publisher=self.publisher))
+
+        response = self.search(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.context['count'], 2)
+        self.assertContains(response, 'Django Unleashed')
+
+
+class BookCatalogueStreamingTests(TestCase):
+    def setUp(self):
+        publisher = Publisher.objects.create(
+            name='Helion', address='Kościuszki 1c', city='Gliwice',
+            state_province='śląskie', country='Poland',
+            website='https://helion.pl/')
+        author = Author.objects.create(first_name='Jan', last_name='Nowak')
+        for n in range(250):
+            Book.objects.create(title='Python %03d' % n, publisher=publisher,
+                                publication_date=date(2017, 1, 1)) \
+                .authors.add(author)
+
+    def test_html_listing_is_streamed_in_chunks(self):
+        response = self.client.get('/books/catalogue/')
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        # strona przed wierszami, dwie paczki wierszy, koniec strony
+        self.assertEqual(len(chunks), 4)
+        self.assertIn('books-catalogue', chunks[0])
+        self.assertIn('Python 000', chunks[1])
+        self.assertIn('by Jan Nowak', chunks[2])
+        self.assertIn('Python 249', chunks[2])
+        self.assertIn('</html>', chunks[3])
+
+    def test_export_formats(self):
+        response = self.client.get('/books/catalogue/', {'format': 'csv'})
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="books.csv"')
+        chunks = list(response.streaming_content)
+        # paczki po kilka KB, nie wiersz na paczkę
+        self.assertLess(len(chunks), 10)
+        self.assertTrue(all(len(chunk.decode()) >= STREAM_BUFFER_SIZE
+                            for chunk in chunks[:-1]))
+        rows = list(read_rows(io.StringIO(b''.join(chunks).decode()), 'csv'))
+        self.assertEqual(len(rows), 250)
+        self.assertEqual(rows[0]['author_first_names'], 'Jan')
+        self.assertEqual(rows[0]['author_last_names'], 'Nowak')
+
+        response = self.client.get('/books/catalogue/', {'format': 'jsonl'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 250)
+        self.assertEqual(json.loads(lines[0])['publisher'], 'Helion')
+
+
+class BookSearchRateLimitTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        ratelimit.reset()
+
+    def search(self, address='10.0.0.1', **headers):
+        return self.client.get('/books/search/', {'q': 'python'},
+                               REMOTE_ADDR=address, **headers)
+
+    @override_settings(RATE_LIMIT_EXEMPT_IPS=['127.0.0.1'], RATE_LIMITS={
+        'books:books-search': {'RATE': 0.5, 'BURST': 2, 'METHODS': ['GET']}})
+    def test_burst_then_429(self):
+        self.assertEqual(self.search().status_code, 200)
+        self.assertEqual(self.search().status_code, 200)
+        response = self.search()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        # osobny kubełek dla innego klienta i bez limitu dla wyjątków
+        self.assertEqual(self.search('10.0.0.2').status_code, 200)
+        for _ in range(3):
+            self.assertEqual(self.search('127.0.0.1').status_code, 200)
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=['127.0.0.1'], RATE_LIMITS={
+        'books:books-search': {'RATE': 0.5, 'BURST': 1, 'METHODS': ['GET']}})
+    def test_client_address_behind_trusted_proxy(self):
+        def search(forwarded, address='127.0.0.1'):
+            return self.search(address,
+                               HTTP_X_FORWARDED_FOR=forwarded).status_code
+
+        self.assertEqual(search('10.0.0.5'), 200)
+        self.assertEqual(search('10.0.0.5'), 429)
+        # adres podany przez klienta nie zmienia kubełka
+        self.assertEqual(search('1.2.3.4, 10.0.0.5'), 429)
+        self.assertEqual(search('10.0.0.6'), 200)
+        # nagłówek od niezaufanego adresu jest ignorowany
+        self.assertEqual(search('10.0.0.7', address='10.0.0.1'), 200)
+        self.assertEqual(search('10.0.0.8', address='10.0.0.1'), 429)
+
+    @override_settings(RATE_LIMIT_CACHE='default', RATE_LIMITS={
+        'books:books-search': {'RATE': 0.5, 'BURST': 1, 'METHODS': ['GET']}})
+    def test_cache_store(self):
+        self.assertEqual(self.search().status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search().status_code, 429)
+        self.assertIsNotNone(
+            caches['default'].get('ratelimit:books:books-search:10.0.0.1'))
+
+
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_concurrent_calls_share_one_computation(self):
+        group = singleflight.Group()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return ['result']
+
+        with ThreadPoolExecutor(4) as pool:
+            leader = pool.submit(group.do, 'q', compute)
+            started.wait(5)
+            followers = [pool.submit(group.do, 'q', compute)
+                         for _ in range(3)]
+            while group.stats()['shared'] < 3:
+                time.sleep(0.01)
+            release.set()
+            results = [f.result() for f in [leader, *followers]]
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(group.stats(),
+                         {'calls': 4, 'shared': 3, 'waited': 0,
+                          'in_flight': 0})
+        # po zakończeniu klucz jest wolny - kolejne wywołanie liczy od nowa
+        group.do('q', compute)
+        self.assertEqual(len(calls), 2)
+
+    def test_errors_are_not_remembered(self):
+        group = singleflight.Group()
+        with self.assertRaises(ZeroDivisionError):
+            group.do('q', lambda: 1 / 0)
+        self.assertEqual(group.do('q', lambda: 1), 1)
+
+    @override_settings(SINGLE_FLIGHT_CACHE='default')
+    def test_waits_for_result_of_another_process(self):
+        group = singleflight.Group()
+        results = iter([None, None, 'from cache'])
+        caches['default'].add(
+            f"singleflight:{hashlib.md5(b'q').hexdigest()}", 'other', 10)
+
+        def compute():
+            raise AssertionError('computed despite the lock')
+
+        self.assertEqual(group.do('q', compute, lambda: next(results)),
+                         'from cache')
+        self.assertEqual(group.stats()['waited'], 1)
+
+    @override_settings(SINGLE_FLIGHT_CACHE='default')
+    def test_search_view_with_cache_lock(self):
+        publisher = Publisher.objects.create(
+            name='Helion', address='', city='', state_province='',
+            country='', website='https://helion.pl/')
+        Book.objects.create(title='Python', publisher=publisher)
+        response = self.client.get('/books/search/', {'q': 'python'})
+        self.assertContains(response, 'Python')
+        # blokady zwolnione, zostają tylko wyniki (klucz z tokenem)
+        self.assertTrue(all(key.count(':') == 4
+                            for key in caches['default']._cache
+                            if 'singleflight' in key))
+
+    @override_settings(SINGLE_FLIGHT_CACHE='default')
+    def test_result_is_shared_through_the_lock_cache(self):
+        # inny proces - osobna grupa; cache wyszukiwań nie jest wspólny,
+        # więc recheck() niczego nie znajdzie
+        group, other = singleflight.Group(), singleflight.Group()
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'shared'
+
+        def compute():
+            raise AssertionError('computed despite the lock')
+
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(other.do, 'q', slow, lambda: None)
+            started.wait(5)
+            follower = pool.submit(group.do, 'q', compute, lambda: None)
+            time.sleep(0.1)
+            release.set()
+            self.assertEqual(leader.result(5), 'shared')
+            self.assertEqual(follower.result(1), 'shared')
+        self.assertEqual(group.stats()['waited'], 1)
+
+
+class AdminPerformanceTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+        self.author = Author.objects.create(first_name='Łukasz',
+                                            last_name='Kowalski')
+        Author.objects.create(first_name='Jan', last_name='Nowak')
+        for n in range(3):
+            publisher = Publisher.objects.create(
+                name=f'Publisher {n}', address='', city='', state_province='',
+                country='', website='http://example.com/')
+            for year in (2015, 2016, 2017):
+                Book.objects.create(title=f'Book {n} {year}',
+                                    publisher=publisher,
+                                    publication_date=date(year, 1, 1))
+
+    def changelist(self, path='/admin/books/book/', **params):
+        return self.client.get(path, params)
+
+    def test_date_hierarchy_is_cached_until_books_change(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.changelist()
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('MIN(', sql)
+        self.assertIn('django_date_trunc', sql)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.changelist()
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertNotIn('MIN(', sql)
+        self.assertNotIn('django_date_trunc', sql)
+        self.assertContains(response, '?publication_date__year=2017')
+
+        Book.objects.create(title='Book 2018', publisher=Publisher.objects
+                            .first(), publication_date=date(2018, 1, 1))
+        self.assertContains(self.changelist(), '?publication_date__year=2018')
+
+    def test_publisher_column_does_not_add_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.changelist()
+        books = [query['sql'] for query in queries
+                 if query['sql'].startswith('SELECT "books_book"."id"')]
+        self.assertEqual(len(books), 1)
+        self.assertIn('INNER JOIN "books_publisher"', books[0])
+
+    def test_approximate_count_only_without_filters(self):
+        Book.objects.filter(title='Book 0 2015').delete()
+        with override_settings(BOOKS_ADMIN_EXACT_COUNT_LIMIT=5):
+            # największe id, usunięta książka nadal się liczy
+            self.assertEqual(self.changelist().context['cl'].result_count, 9)
+            self.assertEqual(
+                self.changelist(publication_date__year=2015)
+                .context['cl'].result_count, 2)
+        self.assertEqual(self.changelist().context['cl'].result_count, 8)
+
+    def test_empty_page_past_estimate_shows_last_page(self):
+        # największe id 8, książek 6
+        Book.objects.filter(publication_date__year=2017).delete()
+        with override_settings(BOOKS_ADMIN_EXACT_COUNT_LIMIT=5), \
+                mock.patch.object(admin.site._registry[Book],
+                                  'list_per_page', 2):
+            self.assertEqual(self.changelist().context['cl'].result_count, 8)
+            cl = self.changelist(p=3).context['cl']
+        self.assertEqual(cl.result_count, 6)
+        self.assertEqual(cl.paginator.num_pages, 3)
+        self.assertEqual(cl.page_num, 2)
+        self.assertEqual(len(cl.result_list), 2)
+
+    def test_only_date_hierarchy_bounds_are_cached(self):
+        queryset = admin.site._registry[Book].get_queryset(None)
+        self.assertEqual(queryset.aggregate(n=Count('pk')), {'n': 9})
+        Book.objects.filter(title='Book 0 2015').update(title='Book')
+        self.assertEqual(queryset.filter(title='Book')
+                         .aggregate(n=Count('pk')), {'n': 1})
+        Book.objects.update(publication_date=date(2000, 1, 1))
+        self.assertEqual(queryset.aggregate(n=Count('pk'),
+                                            first=Min('publication_date')),
+                         {'n': 9, 'first': date(2000, 1, 1)})
+
+    def test_author_search_matches_name_prefixes(self):
+        # autor dodany bez sygnałów, np. przez import_catalogue
+        Author.objects.bulk_create([Author(first_name='Anna',
+                                           last_name='Kowalska')])
+        for term, names in [('kowal', ['Kowalska', 'Kowalski']),
+                            ('Łukasz kow', ['Kowalski']),
+                            ('kowalski Łuk', ['Kowalski']),
+                            ('owal', [])]:
+            result = self.changelist('/admin/books/author/', q=term) \
+                .context['cl'].result_list
+            self.assertEqual(sorted(a.last_name for a in result), names, term)
+
+
+class AdminPickerTests(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.client.login(username='admin', password='admin')
+        self.publisher = Publisher.objects.create(
+            name='Helion', address='', city='', state_province='',
+            country='', website='https://helion.pl/')
+        self.authors = [Author.objects.create(first_name=f'Jan {n:02}',
+                                              last_name='Nowak')
+                        for n in range(25)]
+        self.book = Book.objects.create(title='Python',
+                                        publisher=self.publisher)
+        self.book.authors.add(self.authors[0])
+
+    def change_form(self):
+        return self.client.get(f'/admin/books/book/{self.book.pk}/change/')
+
+    def test_change_form_renders_only_selected_authors(self):
+        self.change_form()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.change_form()
+        self.assertContains(response, 'Jan 00 Nowak')
+        self.assertNotContains(response, 'Jan 01 Nowak')
+        self.assertContains(response, 'books/picker.js')
+
+        Author.objects.bulk_create(
+            Author(first_name='Anna', last_name=f'Kowalska {n}')
+            for n in range(100))
+        with self.assertNumQueries(len(queries)):
+            self.assertNotContains(self.change_form(), 'Kowalska')
+
+    def test_author_lookup_pages_by_prefix(self):
+        url = '/admin/books/book/authors/lookup/'
+        first = self.client.get(url, {'q': 'nowak'}).json()
+        self.assertEqual(len(first['results']), 20)
+        self.assertEqual(first['next'], 2)
+        second = self.client.get(url, {'q': 'nowak', 'page': 2}).json()
+        self.assertEqual([r['label'] for r in second['results']],
+                         [f'Jan {n} Nowak' for n in range(20, 25)])
+        self.assertIsNone(second['next'])
+        self.assertEqual(
+            self.client.get(url, {'q': 'now jan'}).json()['results'][:1],
+            [{'id': self.authors[0].pk, 'label': 'Jan 00 Nowak'}])
+
+    def test_author_lookup_finds_bulk_created_authors(self):
+        # import tworzy autorów przez bulk_create, bez sygnałów
+        self.client.get('/admin/books/book/authors/lookup/', {'q': 'now'})
+        Author.objects.bulk_create([Author(first_name='Anna',
+                                           last_name='Kowalska')])
+        response = self.client.get('/admin/books/book/authors/lookup/',
+                                   {'q': 'kowal'})
+        self.assertEqual([r['label'] for r in response.json()['results']],
+                         ['Anna Kowalska'])
+
+    def test_publisher_lookup(self):
+        url = '/admin/books/book/publishers/lookup/'
+        self.assertEqual(self.client.get(url, {'q': 'hel'}).json()['results'],
+                         [{'id': self.publisher.pk, 'label': 'Helion'}])
+        self.assertFalse(self.client.get(url, {'q': 'x'}).json()['results'])
+
+    def test_lookup_requires_staff(self):
+        self.client.logout()
+        response = self.client.get('/admin/books/book/authors/lookup/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_saving_picked_authors(self):
+        response = self.client.post(
+            f'/admin/books/book/{self.book.pk}/change/',
+            {'title': 'Python', 'publisher': self.publisher.pk,
+             'authors': [self.authors[1].pk, self.authors[2].pk]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(set(self.book.authors.all()),
+                         set(self.authors[1:3]))
+
+
+class CatalogueStatsTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.helion = Publisher.objects.create(
+            name='Helion', address='', city='Gliwice', state_province='',
+            country='Poland', website='https://helion.pl/')
+        self.apress = Publisher.objects.create(
+            name='Apress', address='', city='New York', state_province='',
+            country='USA', website='https://apress.com/')
+        self.holovaty = Author.objects.create(first_name='Adrian',
+                                              last_name='Holovaty')
+        self.kaplan = Author.objects.create(first_name='Jacob',
+                                            last_name='Kaplan-Moss')
+        self.book = Book.objects.create(title='The Django Book',
+                                        publisher=self.apress,
+                                        publication_date=date(2009, 1, 1))
+        self.book.authors.add(self.holovaty, self.kaplan)
+        Book.objects.create(title='Python', publisher=self.helion)
+
+    def counts(self, dimension):
+        return dict(stats.rows(dimension))
+
+    def assertReconciled(self):
+        self.assertEqual(stats.reconcile(dry_run=True), 0)
+
+    def test_counters_follow_changes(self):
+        self.assertEqual(stats.total(), 2)
+        self.assertEqual(self.counts('country'), {'Poland': 1, 'USA': 1})
+        self.assertEqual(self.counts('year'), {'2009': 1, '': 1})
+        self.assertEqual(self.counts('author'),
+                         {str(self.holovaty.pk): 1, str(self.kaplan.pk): 1})
+        self.assertReconciled()
+
+        self.book.publisher = self.helion
+        self.book.publication_date = date(2010, 1, 1)
+        self.book.save()
+        self.assertEqual(self.counts('publisher'), {str(self.helion.pk): 2})
+        self.assertEqual(self.counts('city'), {'Gliwice': 2})
+        self.assertEqual(self.counts('year'), {'2010': 1, '': 1})
+        self.assertReconciled()
+
+        self.helion.city = 'Warszawa'
+        self.helion.save()
+        self.assertEqual(self.counts('city'), {'Warszawa': 2})
+
+        self.book.authors.remove(self.kaplan)
+        self.holovaty.book_set.clear()
+        self.kaplan.book_set.add(self.book)
+        self.assertEqual(self.counts('author'), {str(self.kaplan.pk): 1})
+        self.assertReconciled()
+
+        self.kaplan.delete()
+        self.helion.delete()
+        self.assertEqual(stats.total(), 0)
+        self.assertFalse(CatalogueStat.objects.exists())
+
+    def test_unchanged_save_writes_nothing(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.book.save()
+        self.assertFalse([query for query in queries
+                          if 'books_cataloguestat' in query['sql']])
+
+    def test_reconcile_fixes_drift(self):
+        # update() omija sygnały
+        Book.objects.update(publication_date=date(2000, 1, 1))
+        self.assertEqual(stats.reconcile(dry_run=True), 3)
+        out = io.StringIO()
+        call_command('reconcile_catalogue_stats', stdout=out)
+        self.assertEqual(out.getvalue(), 'Corrected 3 catalogue counters.\n')
+        self.assertEqual(self.counts('year'), {'2000': 2})
+        self.assertReconciled()
+
+    def test_import_updates_counters(self):
+        Importer().run('books', [{'title': 'Two Scoops of Django',
+                                  'publisher': 'Apress',
+                                  'authors': 'Adrian Holovaty'}])
+        self.assertEqual(self.counts('publisher')[str(self.apress.pk)], 2)
+        self.assertReconciled()
+
+    def test_view_reads_counters(self):
+        with self.assertNumQueries(4):
+            data = self.client.get('/books/stats/',
+                                   {'dimension': 'publisher'}).json()
+        self.assertEqual(data, {
+            'total': 2,
+            'dimensions': {'publisher': [
+                {'key': str(self.helion.pk), 'label': 'Helion', 'count': 1},
+                {'key': str(self.apress.pk), 'label': 'Apress', 'count': 1},
+            ]}})
+        response = self.client.get('/books/stats/', {'dimension': 'isbn'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TypeaheadTests(TestCase):
+    def setUp(self):
+        publisher = Publisher.objects.create(
+            name='Helion', address='Kościuszki 1c', city='Gliwice',
+            state_province='śląskie', country='Poland',
+            website='https://helion.pl/')
+        self.author = Author.objects.create(first_name='Łukasz',
+                                            last_name='Żółtowski')
+        self.book = Book.objects.create(title='Python. Wprowadzenie',
+                                        publisher=publisher)
+        typeahead.rebuild()
+        self.addCleanup(typeahead.reset)
+
+    def labels(self, q, kinds=None, limit=typeahead.LIMIT):
+        return [r['label']
+                for r in typeahead.get_index().lookup(q, kinds, limit)]
+
+    def test_prefix_lookup(self):
+        self.assertEqual(self.labels('pyt'), ['Python. Wprowadzenie'])
+        self.assertEqual(self.labels('zolt'), ['Żółtowski Łukasz'])
+        self.assertEqual(self.labels('ła', kinds=['title']), [])
+
+    def test_index_follows_changes_without_rebuild(self):
+        self.book.title = 'Python. Leksykon'
+        self.book.save()
+        self.author.delete()
+        # tylko wersja katalogu, bez przebudowy
+        with self.assertNumQueries(2):
+            self.assertEqual(self.labels('python'), ['Python. Leksykon'])
+            self.assertEqual(self.labels('zo'), [])
+
+    def test_index_rebuilds_after_bulk_import(self):
+        Importer().run('authors', [{'first_name': 'Mark',
+                                    'last_name': 'Lutz'}])
+        self.assertEqual(self.labels('lutz'), ['Lutz Mark'])
+
+    def test_index_rebuilds_after_write_from_other_process(self):
+        self.labels('pyt')
+        # inny worker: zapis bez sygnałów w tym procesie
+        Author.objects.bulk_create([Author(first_name='Mark',
+                                           last_name='Lutz')])
+        CatalogueVersion.objects.update(token='other-worker')
+        self.assertEqual(self.labels('lutz'), ['Lutz Mark'])
+
+    def test_endpoint(self):
+        response = self.client.get('/books/typeahead/', {'q': 'Pyth'})
+        self.assertEqual(response.json()['results'],
+                         [{'kind': 'title', 'id': self.book.pk,
+                           'label': 'Python. Wprowadzenie'}])
+
+    def test_endpoint_echoes_long_query(self):
+        q = 'x' * 150
+        response = self.client.get('/books/typeahead/', {'q': q}).json()
+        self.assertEqual(response['query'], q)
+        self.assertEqual(response['results'], [])
+
+    def test_long_suggestion_is_accepted_by_search(self):
+        self.book.title = 'Python. Wprowadzenie do programowania'
+        self.book.save()
+        suggestion = self.client.get('/books/typeahead/', {'q': 'pyth'}) \
+            .json()['results'][0]['label']
+        self.assertGreater(len(suggestion), 20)
+        response = self.client.get('/books/search/', {'q': suggestion})
+        self.assertEqual([book.title for book in response.context['page']],
+                         [suggestion])
+
+    def test_kind_filter_stops_at_limit(self):
+        typeahead.get_index().load(
+            [('title', pk, [f'Kowalski {pk:03}']) for pk in range(500)] +
+            [('author', pk, [f'Kowalski Jan {pk}']) for pk in range(3)])
+        with mock.patch.object(typeahead.PrefixIndex, '_matches',
+                               autospec=True,
+                               side_effect=typeahead.PrefixIndex._matches
+                               ) as matches:
+            self.assertEqual(self.labels('kowalski', ['author'], 2),
+                             ['Kowalski Jan 0', 'Kowalski Jan 1'])
+        self.assertEqual(len(matches.call_args_list), 1)
+        self.assertEqual(self.labels('kowalski', limit=3),
+                         ['Kowalski 000', 'Kowalski 001', 'Kowalski 002'])
+
+
+class QueryPlanTests(TestCase):
+    def plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return ' | '.join(row[-1] for row in cursor.fetchall())
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = self.plan(queryset)
+        self.assertIn(index or 'INDEX', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_publisher_default_ordering(self):
+        self.assertUsesIndex(Publisher.objects.all())
+
+    def test_book_admin_ordering_and_date_hierarchy(self):
+        self.assertUsesIndex(Book.objects.order_by('-publication_date'))
+        self.assertUsesIndex(
+            Book.objects.filter(publication_date__year=2017)
+            .order_by('-publication_date'))
+
+    def test_book_title_keyset(self):
+        self.assertUsesIndex(
+            Book.objects.filter(title__gt='M').order_by('title', 'pk'))
+
+    def test_book_document_keyset(self):
+        self.assertUsesIndex(
+            BookDocument.objects.filter(title__gt='M').order_by('title', 'pk'),
+            'books_bookd_title_82ca19_idx')
+
+    def test_author_name_lookup(self):
+        self.assertUsesIndex(
+            Author.objects.filter(last_name='Holovaty')
+            .order_by('last_name', 'first_name'),
+            'books_autho_last_na_7ca250_idx')
+
+    def test_author_search_prefixes(self):
+        plan = self.plan(filter_name_prefix(Author.objects.all(), 'kow'))
+        self.assertIn('books_author_first_name_nocase', plan)
+        self.assertIn('books_author_last_name_nocase', plan)
+
+    def test_author_books_through_table(self):
+        self.assertUsesIndex(
+            Book.authors.through.objects.filter(author_id=1)
+            .values_list('book_id', flat=True),
+            'COVERING INDEX books_book_authors_author_book_idx')
+
+
+class CatalogueImportExportTests(TestCase):
+    BOOKS_CSV = (
+        'title,publisher,publication_date,authors\n'
+        'The Django Book,Apress,2009-01-01,Adrian Holovaty; '
+        'Jacob Kaplan-Moss\n'
+        'Two Scoops of Django,Two Scoops Press,,Daniel Roy Greenfeld\n'
+        'The Django Book,Apress,2009-01-01,Adrian Holovaty\n')
+
+    def import_books(self, data, fmt='csv', chunk_size=2):
+        importer = Importer(chunk_size)
+        return importer.run('books', read_rows(io.StringIO(data), fmt))
+
+    def test_import_books_with_related_objects(self):
+        created, skipped = self.import_books(self.BOOKS_CSV)
+        self.assertEqual(created,
+                         {'publishers': 2, 'authors': 3, 'books': 2})
+        self.assertEqual(skipped, 1)
+
+        book = Book.objects.get(title='The Django Book')
+        self.assertEqual(book.publisher.name, 'Apress')
+        self.assertEqual(book.publication_date, date(2009, 1, 1))
+        self.assertEqual(sorted(a.last_name for a in book.authors.all()),
+                         ['Holovaty', 'Kaplan-Moss'])
+        author = Author.objects.get(last_name='Greenfeld')
+        self.assertEqual(author.first_name, 'Daniel Roy')
+        # bulk_create omija sygnały, indeks jest aktualizowany przez importer
+        self.assertEqual([b.title for b in search_books('kaplan')],
+                         ['The Django Book'])
+
+        created, skipped = self.import_books(self.BOOKS_CSV)
+        self.assertEqual(created['books'], 0)
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_export_round_trip(self):
+        self.import_books(self.BOOKS_CSV)
+        out = io.StringIO()
+        call_command('export_catalogue', 'books', '--format', 'jsonl',
+                     '--chunk-size', '1', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(rows[0], {
+            'title': 'The Django Book',
+            'publisher': 'Apress',
+            'publication_date': '2009-01-01',
+            'authors': [
+                {'first_name': 'Adrian', 'last_name': 'Holovaty'},
+                {'first_name': 'Jacob', 'last_name': 'Kaplan-Moss'},
+            ],
+        })
+
+        Book.objects.all().delete()
+        self.import_books(out.getvalue(), fmt='jsonl')
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_export_queries_per_chunk(self):
+        self.import_books(self.BOOKS_CSV)
+        # książki i autorzy dla każdej paczki, puste zapytanie na końcu
+        with self.assertNumQueries(5):
+            rows = list(export_rows('books', chunk_size=1))
+        self.assertEqual([len(row['authors']) for row in rows], [2, 1])
+
+    def test_multi_word_names_round_trip(self):
+        publisher = Publisher.objects.create(name='Apress')
+        Author.objects.create(first_name='Guido', last_name='van Rossum')
+        Author.objects.create(first_name='Mary Ann', last_name='Smith')
+        book = Book.objects.create(title='Python', publisher=publisher)
+        book.authors.set(Author.objects.all())
+        mononym = Author.objects.create(first_name='', last_name='Plato')
+        Book.objects.create(title='Republic', publisher=publisher) \
+            .authors.add(mononym)
+        expected = {(a.first_name, a.last_name, b.title)
+                    for b in Book.objects.all() for a in b.authors.all()}
+
+        for fmt in ('csv', 'jsonl'):
+            out = io.StringIO()
+            call_command('export_catalogue', 'books', '--format', fmt,
+                         stdout=out)
+            Book.objects.all().delete()
+            Author.objects.all().delete()
+            self.import_books(out.getvalue(), fmt=fmt)
+            self.assertEqual(
+                {(a.first_name, a.last_name, b.title)
+                 for b in Book.objects.all() for a in b.authors.all()},
+                expected, fmt)
+            self.assertEqual(Author.objects.count(), 3)
+
+
+@override_settings(BOOKS_READ_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        routers.reset()
+        self.router = routers.ReplicaRouter()
+
+    def tearDown(self):
+        routers.reset()
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        self.assertEqual(self.router.db_for_read(Book), 'replica')
+        self.assertEqual(self.router.db_for_write(Book), 'default')
+        self.assertIsNone(self.router.db_for_read(OutgoingMessage))
+
+    def test_reads_stick_to_primary_after_write(self):
+        request = RequestFactory().post('/admin/books/book/add/')
+
+        def view(request):
+            self.router.db_for_write(Book)
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(request)
+        self.assertIn(PINNED_COOKIE, response.cookies)
+
+        request = RequestFactory().get('/books/search/')
+        request.COOKIES[PINNED_COOKIE] = '1'
+        databases = []
+
+        def view(request):
+            databases.append(self.router.db_for_read(Book))
+            return HttpResponse()
+
+        response = ReplicaPinningMiddleware(view)(request)
+        self.assertEqual(databases, ['default'])
+        self.assertNotIn(PINNED_COOKIE, response.cookies)
+        self.assertEqual(self.router.db_for_read(Book), 'replica')
+
+
+class ReplicationTests(TransactionTestCase):
+    # ATTACH/DETACH nie działają wewnątrz otwartej transakcji
+    def test_books_tables_are_copied_to_replica_file(self):
+        publisher = Publisher.objects.create(name='Helion')
+        author = Author.objects.create(first_name='Jan', last_name='Nowak')
+        Book.objects.create(title='Django', publisher=publisher) \
+            .authors.add(author)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT sql FROM sqlite_master "
+                               "WHERE type = 'table' AND name LIKE 'books_%' "
+                               "AND name NOT LIKE 'books_book_fts_%'")
+                schema = [row[0] for row in cursor.fetchall()]
+            replica = sqlite3.connect(path)
+            for sql in schema:
+                replica.execute(sql)
+            replica.close()
+
+            replicate(path)
+
+            replica = sqlite3.connect(path)
+            self.assertEqual(
+                replica.execute('SELECT title FROM books_book').fetchall(),
+                [('Django',)])
+            self.assertEqual(replica.execute(
+                "SELECT count FROM books_cataloguestat "
+                "WHERE dimension = 'total'").fetchall(), [(1,)])
+            self.assertEqual(replica.execute(
+                "SELECT rowid FROM books_book_fts "
+                "WHERE books_book_fts MATCH 'nowak'").fetchall(),
+                [(Book.objects.get().pk,)])
+            replica.close()
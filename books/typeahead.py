@@ -0,0 +1,166 @@
+import bisect
+import heapq
+import itertools
+import threading
+
+from . import cache as search_cache
+from .models import Author, Book
+from .search import normalise
+
+LIMIT = 10
+
+
+class PrefixIndex:
+    # osobna posortowana lista (klucz, id, etykieta) dla każdego rodzaju -
+    # prefiks to zakres wyznaczony przez bisect, a filtr po rodzaju
+    # nie przegląda wpisów innych rodzajów
+
+    def __init__(self):
+        self._entries = {}
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries.values())
+
+    def replace(self, kind, pk, labels):
+        # labels - etykiety obiektu, pusta lista usuwa obiekt z indeksu
+        entries = [(normalise(label), pk, label) for label in labels]
+        with self._lock:
+            kind_entries = self._entries.setdefault(kind, [])
+            for entry in self._keys.pop((kind, pk), ()):
+                i = bisect.bisect_left(kind_entries, entry)
+                if i < len(kind_entries) and kind_entries[i] == entry:
+                    del kind_entries[i]
+            for entry in entries:
+                bisect.insort(kind_entries, entry)
+            if entries:
+                self._keys[(kind, pk)] = entries
+
+    def load(self, items):
+        # items - (rodzaj, id, etykiety), budowanie od zera
+        entries = {}
+        keys = {}
+        for kind, pk, labels in items:
+            keys[(kind, pk)] = [(normalise(label), pk, label)
+                                for label in labels]
+            entries.setdefault(kind, []).extend(keys[(kind, pk)])
+        for kind_entries in entries.values():
+            kind_entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+
+    def clear(self):
+        self.load([])
+
+    def _matches(self, entries, prefix, limit):
+        # najwyżej limit obiektów jednego rodzaju
+        results = []
+        seen = set()
+        i = bisect.bisect_left(entries, (prefix,))
+        while i < len(entries) and (limit is None or len(results) < limit):
+            key, pk, label = entries[i]
+            if not key.startswith(prefix):
+                break
+            if pk not in seen:
+                seen.add(pk)
+                results.append((key, pk, label))
+            i += 1
+        return results
+
+    def lookup(self, prefix, kinds=None, limit=LIMIT):
+        prefix = normalise(prefix)
+        if not prefix:
+            return []
+
+        with self._lock:
+            matches = [[(key, kind, pk, label) for key, pk, label
+                        in self._matches(entries, prefix, limit)]
+                       for kind, entries in self._entries.items()
+                       if kinds is None or kind in kinds]
+        return [{'kind': kind, 'id': pk, 'label': label}
+                for key, kind, pk, label
+                in itertools.islice(heapq.merge(*matches), limit)]
+
+
+def book_labels(book):
+    return [book.title]
+
+
+def author_labels(author):
+    # po imieniu i po nazwisku
+    return [str(author), f'{author.last_name} {author.first_name}']
+
+
+index = PrefixIndex()
+# wersja katalogu (books.cache), z której zbudowany jest indeks;
+# None - jeszcze nie zbudowany
+_version = None
+_load_lock = threading.RLock()
+
+
+def get_index():
+    # budujemy przy pierwszym użyciu, a nie w AppConfig.ready(),
+    # bo tam baza może jeszcze nie istnieć (migrate, testy);
+    # zapisy z innych procesów, import i replikacja zmieniają wersję
+    # katalogu bez sygnałów w tym procesie - wtedy budujemy od nowa
+    version = search_cache.catalogue_version()
+    if version != _version:
+        with _load_lock:
+            if version != _version:
+                rebuild(version)
+    return index
+
+
+def rebuild(version=None):
+    # indeks od zera z bazy; od tej chwili zapisy aktualizują go na bieżąco
+    global _version
+    if version is None:
+        version = search_cache.catalogue_version()
+    books = Book.objects.values_list('pk', 'title')
+    authors = Author.objects.only('first_name', 'last_name')
+    with _load_lock:
+        index.load(
+            [('title', pk, [title]) for pk, title in books.iterator()] +
+            [('author', author.pk, author_labels(author))
+             for author in authors.iterator()])
+        _version = version
+
+
+def reset():
+    # następne get_index() zbuduje indeks od nowa
+    global _version
+    with _load_lock:
+        index.clear()
+        _version = None
+
+
+def follow(versions):
+    # versions - (poprzednia, nowa) z bump_catalogue_version po zapisie
+    # w tym procesie, którego zmiany indeks już ma; jeśli indeks był
+    # na poprzedniej wersji, jest aktualny także na nowej, inaczej
+    # ominął cudzy zapis i get_index() zbuduje go od nowa
+    global _version
+    previous, current = versions
+    with _load_lock:
+        if _version is not None and _version == previous:
+            _version = current
+
+
+def _replace(kind, pk, labels):
+    with _load_lock:
+        if _version is not None:
+            index.replace(kind, pk, labels)
+
+
+def update_book(book):
+    _replace('title', book.pk, book_labels(book))
+
+
+def update_author(author):
+    _replace('author', author.pk, author_labels(author))
+
+
+def remove(kind, pk):
+    _replace(kind, pk, [])
@@ -5,4 +5,12 @@ from . import views as books_views
 urlpatterns = [
     url(r'^search/$', books_views.books_search,
         name='books-search'),
+    url(r'^search/cache/$', books_views.books_search_cache_stats,
+        name='books-search-cache'),
+    url(r'^catalogue/$', books_views.books_catalogue,
+        name='books-catalogue'),
+    url(r'^typeahead/$', books_views.books_typeahead,
+        name='books-typeahead'),
+    url(r'^stats/$', books_views.books_stats,
+        name='books-stats'),
 ]
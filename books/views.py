@@ -1,8 +1,69 @@
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 
-from .models import Book
+from master.http_cache import cache_policy, templates_version
+from master.singleflight import Group
+from master.streaming import stream_template
 
+from . import cache as search_cache
+from . import stats, typeahead
+from .bulk import buffered, export_rows, format_rows, iter_chunks
+from .models import Author, BookDocument, Publisher
+from .pagination import KeysetPage, paginate, page_size
+from .search import count_books, hits_in_order, normalise, search_hits
 
+# równoległe identyczne wyszukiwania w procesie
+search_flights = Group()
+
+# formularz musi przyjąć każdą podpowiedź typeahead: tytuł ma do 100
+# znaków, "imię nazwisko" autora do 71
+MAX_QUERY_LENGTH = 100
+
+
+def catalogue_etag(request):
+    # strona wyników zależy od adresu (zapytanie, kursor), danych
+    # katalogu i szablonów; wersja katalogu z bazy, z której czyta request
+    return f'{search_cache.catalogue_version()}-{templates_version()}'
+
+
+def _search_page(q, variant, size, after, before):
+    page = paginate(search_hits(q), after=after, before=before, size=size)
+    search_cache.set_results(q, variant, {'ids': [book.pk for book in page],
+                                          'next': page.next_cursor,
+                                          'prev': page.prev_cursor})
+    return page
+
+
+def _cached_page(cached):
+    return KeysetPage(hits_in_order(cached['ids']), cached['next'],
+                      cached['prev'])
+
+
+def _count(q):
+    count = count_books(q)
+    search_cache.set_results(q, 'count', count)
+    return count
+
+
+def _coalesced(q, variant, compute):
+    # po wygaśnięciu wpisu popularne zapytanie przychodzi naraz z wielu
+    # wątków - liczy je jeden, reszta dostaje ten sam wynik; z
+    # SINGLE_FLIGHT_CACHE również między procesami (master.singleflight)
+    def recheck():
+        cached = search_cache.get_results(q, variant)
+        if cached is None or variant == 'count':
+            return cached
+        return _cached_page(cached)
+
+    key = f'books-search:{normalise(q)}:{variant}'
+    return search_flights.do(key, compute, recheck)
+
+
+# private, max-age=0 - przeglądarka pyta o ETag przy każdym wejściu;
+# po zapisie klient czyta z bazy głównej (books.middleware), więc nie
+# może dostać strony zapamiętanej z repliki
+@cache_policy(etag=catalogue_etag, private=True, page_cache=True)
 def books_search(request):
     errors = []
 
@@ -11,17 +72,105 @@ def books_search(request):
 
         if not q:
             errors.append('Enter a search term.')
-        elif len(q) > 20:
-            errors.append('Please enter at most 20 characters.')
+        elif len(q) > MAX_QUERY_LENGTH:
+            errors.append(
+                f'Please enter at most {MAX_QUERY_LENGTH} characters.')
         else:
-            result = Book.objects.filter(title__icontains=q)
+            size = page_size(request.GET.get('size'))
+            after = request.GET.get('after')
+            before = request.GET.get('before')
+
+            variant = f'page:{size}:{after}:{before}'
+            cached = search_cache.get_results(q, variant)
+            if cached is None:
+                page = _coalesced(q, variant, lambda: _search_page(
+                    q, variant, size, after, before))
+            else:
+                page = _cached_page(cached)
+
+            count = search_cache.get_results(q, 'count')
+            if count is None:
+                count = _coalesced(q, 'count', lambda: _count(q))
+
             return render(request, 'books/search_result.html',
                           {'current_section': 'books-search-result',
                            'query': q,
-                           'result': result,
+                           'size': size,
+                           'count': count,
+                           'page': page,
                            })
 
     return render(request, 'books/search_form.html',
                   {'current_section': 'books-search-form',
                    'errors': errors
                    })
+
+
+def books_search_cache_stats(request):
+    # tylko lokalnie, jak /_stats/
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        raise Http404()
+
+    return JsonResponse({**search_cache.stats(),
+                         'single_flight': search_flights.stats()})
+
+
+def books_typeahead(request):
+    # query - dokładnie to, co przyszło; skrypt formularza porównuje je
+    # z polem, żeby pominąć spóźnione odpowiedzi
+    q = request.GET.get('q', '')
+    kinds = request.GET.getlist('kind') or None
+    results = typeahead.get_index().lookup(q[:MAX_QUERY_LENGTH], kinds)
+    return JsonResponse({'query': q, 'results': results})
+
+
+def _stat_rows(dimension, limit):
+    rows = stats.rows(dimension, limit)
+    # nazwy tylko dla pokazanych wierszy, jednym zapytaniem
+    model = {'publisher': Publisher, 'author': Author}.get(dimension)
+    labels = {}
+    if model:
+        objects = model.objects.in_bulk([int(key) for key, _ in rows])
+        labels = {str(pk): str(obj) for pk, obj in objects.items()}
+    return [{'key': key, 'label': labels.get(key, key), 'count': count}
+            for key, count in rows]
+
+
+@cache_policy(etag=catalogue_etag, private=True)
+def books_stats(request):
+    # gotowe liczniki z books.stats - kilka wierszy z indeksu zamiast
+    # GROUP BY po katalogu
+    limit = page_size(request.GET.get('limit'))
+    dimension = request.GET.get('dimension')
+    if dimension is None:
+        dimensions = [d for d in stats.DIMENSIONS if d != 'total']
+    elif dimension in stats.DIMENSIONS:
+        dimensions = [dimension]
+    else:
+        return JsonResponse(
+            {'error': f'Unknown dimension, choose from: '
+                      f"{', '.join(stats.DIMENSIONS)}."}, status=400)
+    return JsonResponse({
+        'total': stats.total(),
+        'dimensions': {d: _stat_rows(d, limit) for d in dimensions},
+    })
+
+
+def books_catalogue(request):
+    # cały katalog, strumieniowo - w pamięci jest jedna paczka książek
+    fmt = request.GET.get('format')
+    if fmt in ('csv', 'jsonl'):
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(
+            buffered(format_rows(fmt, 'books', export_rows('books'))),
+            content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = \
+            f'attachment; filename="books.{fmt}"'
+        return response
+
+    documents = (document
+                 for chunk in iter_chunks(BookDocument.objects.all())
+                 for document in chunk)
+    return stream_template(request, 'books/catalogue.html',
+                           {'current_section': 'books-catalogue'},
+                           documents, 'books/catalogue_rows.html')
@@ -1,3 +1,13 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import OutgoingMessage
+
+
+class OutgoingMessageAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'from_email', 'status', 'attempts',
+                    'next_attempt', 'sent')
+    list_filter = ('status',)
+    readonly_fields = ('created', 'sent', 'last_error')
+
+
+admin.site.register(OutgoingMessage, OutgoingMessageAdmin)
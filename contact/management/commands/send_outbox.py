@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from contact import outbox
+
+
+class Command(BaseCommand):
+    help = 'Sends queued contact messages in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=outbox.BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep draining the outbox until stopped.')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when the outbox is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                sent, failed = outbox.drain(options['batch_size'])
+            except Exception as e:
+                if not options['loop']:
+                    raise
+                # np. baza chwilowo zablokowana - worker działa dalej,
+                # pobrane wiadomości wrócą po końcu dzierżawy
+                self.stderr.write(f'drain failed: {e!r}')
+                time.sleep(options['interval'])
+                continue
+            if sent or failed:
+                self.stdout.write(f'sent {sent}, failed {failed}')
+            if not options['loop']:
+                break
+            # pełna paczka - w kolejce prawdopodobnie jest więcej
+            if sent + failed < options['batch_size']:
+                time.sleep(options['interval'])
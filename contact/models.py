@@ -1,3 +1,34 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class OutgoingMessage(models.Model):
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'pending'),
+        (SENT, 'sent'),
+        (FAILED, 'failed'),
+    )
+
+    subject = models.CharField(max_length=100)
+    message = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.subject
+
+    class Meta:
+        ordering = ['next_attempt']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt']),
+        ]
@@ -0,0 +1,101 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import OutgoingMessage
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+
+# ile czasu worker ma na wysłanie pobranej wiadomości,
+# zanim inny worker uzna ją za porzuconą
+LEASE = timedelta(minutes=5)
+
+
+def backoff(attempts):
+    # 1, 2, 4, 8... minut, najwyżej godzina
+    return timedelta(minutes=min(2 ** (attempts - 1), 60))
+
+
+def enqueue(cd):
+    return OutgoingMessage.objects.create(
+        subject=cd['subject'],
+        message=cd['message'],
+        from_email=cd.get('email', 'noreply@example.com'),
+        recipient=settings.CONTACT_RECIPIENT)
+
+
+def claim(batch_size=BATCH_SIZE):
+    now = timezone.now()
+    candidates = (OutgoingMessage.objects
+                  .filter(status=OutgoingMessage.PENDING,
+                          next_attempt__lte=now)
+                  [:batch_size])
+    claimed = []
+    for message in candidates:
+        # UPDATE z warunkiem na starą wartość - wiadomość pobiera tylko
+        # jeden worker, bez SELECT ... FOR UPDATE, którego sqlite nie ma
+        won = (OutgoingMessage.objects
+               .filter(pk=message.pk, next_attempt=message.next_attempt)
+               .update(next_attempt=now + LEASE))
+        if won:
+            claimed.append(message)
+    return claimed
+
+
+def _failed(message, error):
+    message.attempts += 1
+    message.last_error = repr(error)
+    if message.attempts >= MAX_ATTEMPTS:
+        message.status = OutgoingMessage.FAILED
+    else:
+        message.next_attempt = timezone.now() + backoff(message.attempts)
+
+
+def _save(message):
+    message.save(update_fields=['attempts', 'status', 'next_attempt',
+                                'sent', 'last_error'])
+
+
+def drain(batch_size=BATCH_SIZE, connection=None):
+    messages = claim(batch_size)
+    if not messages:
+        return 0, 0
+
+    if connection is None:
+        connection = get_connection()
+
+    try:
+        connection.open()
+    except Exception as e:
+        # serwer poczty nie odpowiada - każda pobrana wiadomość traci
+        # próbę i czeka, zamiast leżeć do końca dzierżawy
+        for message in messages:
+            _failed(message, e)
+            _save(message)
+        return 0, len(messages)
+
+    sent = failed = 0
+    # jedno połączenie z serwerem poczty na całą paczkę
+    try:
+        for message in messages:
+            email = EmailMessage(message.subject, message.message,
+                                 message.from_email or None,
+                                 [message.recipient],
+                                 connection=connection)
+            try:
+                email.send()
+            except Exception as e:
+                failed += 1
+                _failed(message, e)
+            else:
+                sent += 1
+                message.attempts += 1
+                message.status = OutgoingMessage.SENT
+                message.sent = timezone.now()
+            _save(message)
+    finally:
+        connection.close()
+    return sent, failed
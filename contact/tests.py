@@ -1,3 +1,112 @@
-from django.test import TestCase
+import io
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from master import ratelimit
+
+from . import outbox
+from .models import OutgoingMessage
+
+
+class ContactOutboxTests(TestCase):
+    def post(self, **extra):
+        return self.client.post('/contact/', {
+            'subject': 'Hello',
+            'email': 'reader@example.com',
+            'message': 'I really like this site.',
+        }, **extra)
+
+    @override_settings(RATE_LIMITS={'contact:contact-form': {
+        'RATE': 1 / 60, 'BURST': 2, 'METHODS': ['POST']}})
+    def test_posts_are_rate_limited(self):
+        ratelimit.reset()
+        for _ in range(2):
+            self.assertEqual(self.post(REMOTE_ADDR='10.0.0.1').status_code,
+                             302)
+        response = self.post(REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertEqual(OutgoingMessage.objects.count(), 2)
+        # formularz nadal się wyświetla
+        response = self.client.get('/contact/', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_view_only_enqueues(self):
+        response = self.post()
+        self.assertRedirects(response, '/contact/thanks/')
+        self.assertEqual(len(mail.outbox), 0)
+
+        message = OutgoingMessage.objects.get()
+        self.assertEqual(message.status, OutgoingMessage.PENDING)
+        self.assertEqual(message.recipient, 'siteowner@example.com')
+
+    def test_drain_sends_batch_over_one_connection(self):
+        for _ in range(3):
+            self.post()
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.'
+                        'open') as open_connection:
+            self.assertEqual(outbox.drain(), (3, 0))
+        self.assertEqual(open_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].from_email, 'reader@example.com')
+        self.assertFalse(OutgoingMessage.objects.exclude(
+            status=OutgoingMessage.SENT).exists())
+        self.assertEqual(outbox.drain(), (0, 0))
+
+    def test_failed_delivery_is_retried_with_backoff(self):
+        self.post()
+        with mock.patch('django.core.mail.EmailMessage.send',
+                        side_effect=OSError('connection refused')):
+            self.assertEqual(outbox.drain(), (0, 1))
+
+        message = OutgoingMessage.objects.get()
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.next_attempt, timezone.now())
+        self.assertEqual(outbox.drain(), (0, 0))
+
+        message.attempts = outbox.MAX_ATTEMPTS - 1
+        message.next_attempt = timezone.now() - timedelta(seconds=1)
+        message.save()
+        with mock.patch('django.core.mail.EmailMessage.send',
+                        side_effect=OSError('connection refused')):
+            outbox.drain()
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutgoingMessage.FAILED)
+
+    def test_unreachable_mail_server_counts_as_attempt(self):
+        for _ in range(2):
+            self.post()
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.'
+                        'open', side_effect=OSError('connection refused')):
+            self.assertEqual(outbox.drain(), (0, 2))
+
+        for message in OutgoingMessage.objects.all():
+            self.assertEqual(message.status, OutgoingMessage.PENDING)
+            self.assertEqual(message.attempts, 1)
+            self.assertIn('connection refused', message.last_error)
+            self.assertLess(message.next_attempt,
+                            timezone.now() + outbox.LEASE)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_loop_survives_drain_errors(self):
+        errors = io.StringIO()
+        drained = []
+
+        def drain(batch_size):
+            drained.append(batch_size)
+            if len(drained) == 1:
+                raise OSError('database is locked')
+            raise KeyboardInterrupt
+
+        with mock.patch.object(outbox, 'drain', drain), \
+                mock.patch('time.sleep'):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('send_outbox', '--loop', stderr=errors)
+        self.assertEqual(len(drained), 2)
+        self.assertIn('database is locked', errors.getvalue())
@@ -1,7 +1,7 @@
-from django.core.mail import get_connection, send_mail
 from django.http import HttpResponseRedirect
 from django.shortcuts import render
 
+from . import outbox
 from .forms import ContactForm
 
 
@@ -9,16 +9,9 @@ def contact(request):
     if request.method == 'POST':
         form = ContactForm(request.POST)
         if form.is_valid():
-            cd = form.cleaned_data
-            con = get_connection(
-                'django.core.mail.backends.console.EmailBackend')
-            send_mail(
-                cd['subject'],
-                cd['message'],
-                cd.get('email', 'noreply@example.com'),
-                ['siteowner@example.com'],
-                connection=con
-            )
+            # wysyłką zajmuje się manage.py send_outbox,
+            # request nie czeka na serwer poczty
+            outbox.enqueue(form.cleaned_data)
 
             return HttpResponseRedirect('/contact/thanks/')
     else:
@@ -0,0 +1,2 @@
+# podłączenie master.db.apply_sqlite_pragmas do connection_created
+from . import db  # noqa: F401
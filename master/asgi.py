@@ -0,0 +1,17 @@
+"""
+ASGI config for master project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+e.g. for uvicorn master.asgi:application. Django 1.11 has no ASGI support
+of its own; master.asgi_handler runs the WSGI application in thread pools.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "master.settings")
+
+from master.asgi_handler import ASGIHandler  # noqa: E402
+
+application = ASGIHandler(get_wsgi_application())
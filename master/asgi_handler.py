@@ -0,0 +1,152 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.urlresolvers import Resolver404, resolve
+
+_DONE = object()
+
+
+def _environ(scope, body):
+    # request ASGI jako environ WSGI (PEP 3333)
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI podaje ścieżkę jako bajty zdekodowane latin-1
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'REMOTE_ADDR': client[0],
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        if name in environ:
+            # powtórzone nagłówki łączymy przecinkiem, ciasteczka średnikiem
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = f'{environ[name]}{separator}{value}'
+        environ[name] = value
+    return environ
+
+
+class ASGIHandler:
+    # Django 1.11 nie ma widoków async ani async ORM, więc widoki działają
+    # w pulach wątków, a pętla zdarzeń trzyma połączenia i czeka;
+    # widoki z ASGI_IO_VIEWS (czekające na bazę) mają osobną pulę,
+    # żeby wolne requesty nie zajęły wątków szybkim
+
+    def __init__(self, wsgi_application, threads=None, io_threads=None):
+        self.wsgi_application = wsgi_application
+        self.pool = ThreadPoolExecutor(threads or settings.ASGI_THREADS,
+                                       thread_name_prefix='asgi')
+        self.io_pool = ThreadPoolExecutor(
+            io_threads or settings.ASGI_IO_THREADS,
+            thread_name_prefix='asgi-io')
+        self.io_views = set(settings.ASGI_IO_VIEWS)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.pool.shutdown(wait=False)
+                self.io_pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def pool_for(self, path):
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return self.pool
+        return self.io_pool if match.view_name in self.io_views else self.pool
+
+    async def http(self, scope, receive, send):
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+
+        loop = asyncio.get_event_loop()
+        pool = self.pool_for(scope['path'])
+        environ = _environ(scope, b''.join(body))
+        # jedna paczka naraz - wątek czeka, aż pętla ją wyśle
+        queue = asyncio.Queue(maxsize=1)
+        cancelled = threading.Event()
+
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            put({'type': 'http.response.start',
+                 'status': int(status.split(' ', 1)[0]),
+                 'headers': [(name.lower().encode('latin-1'),
+                              value.encode('latin-1'))
+                             for name, value in headers]})
+
+        def run():
+            # widok, treść i close() w jednym wątku puli - połączenie
+            # z bazą, stan routera replik i profilera są związane z wątkiem;
+            # StreamingHttpResponse liczy treść dopiero przy iteracji
+            response = None
+            try:
+                response = self.wsgi_application(environ, start_response)
+                for chunk in response:
+                    if cancelled.is_set():
+                        break
+                    put({'type': 'http.response.body', 'body': chunk,
+                         'more_body': True})
+            finally:
+                try:
+                    if hasattr(response, 'close'):
+                        # request_finished - zamyka m.in. połączenia z bazą
+                        response.close()
+                finally:
+                    put(_DONE)
+
+        worker = loop.run_in_executor(pool, run)
+        finished = False
+        try:
+            while True:
+                message = await queue.get()
+                if message is _DONE:
+                    finished = True
+                    break
+                await send(message)
+            await worker
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            # klient się rozłączył albo send() zawiódł - wątek kończy
+            # iterację, a my odbieramy paczki, na które czeka
+            cancelled.set()
+            while not finished:
+                finished = await queue.get() is _DONE
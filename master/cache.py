@@ -0,0 +1,105 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+# tak jak w LocMemCache - jedna przestrzeń na nazwę (LOCATION)
+_caches = {}
+_locks = {}
+
+
+class LRUCache(BaseCache):
+    # LocMemCache z django 1.11 przy przepełnieniu usuwa co n-ty klucz,
+    # niezależnie od tego, jak dawno był używany;
+    # tutaj wypada najdawniej odczytany wpis, wygasłe wpisy znikają przy get
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        self._cache = _caches.setdefault(name, OrderedDict())
+        self._lock = _locks.setdefault(name, threading.Lock())
+
+    def _expired(self, key):
+        expiry = self._cache[key][1]
+        return expiry is not None and expiry <= time.time()
+
+    def _get(self, key):
+        if key not in self._cache:
+            return None
+        if self._expired(key):
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return self._cache[key][0]
+
+    def _set(self, key, value, timeout):
+        self._cache[key] = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                            self.get_backend_timeout(timeout))
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._max_entries:
+            self._cache.popitem(last=False)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._set(key, value, timeout)
+            return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            pickled = self._get(key)
+        if pickled is None:
+            return default
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            self._set(key, value, timeout)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            pickled = self._get(key)
+            if pickled is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(pickled) + delta
+            # incr nie przedłuża życia klucza
+            self._cache[key] = (pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                                self._cache[key][1])
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            return self._get(key) is not None
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# backendy trzymające wpisy w pamięci procesu - każdy worker ma własne
+LOCAL_BACKENDS = (LocMemCache, LRUCache)
+
+
+def is_shared(alias):
+    # czy wpisy cache są widoczne dla wszystkich procesów serwera
+    return not isinstance(caches[alias], LOCAL_BACKENDS)
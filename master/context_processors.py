@@ -0,0 +1,87 @@
+import functools
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.template.context import RequestContext
+from django.utils.functional import SimpleLazyObject
+
+# processor -> ile razy był wywołany przy renderowaniu
+_offered = defaultdict(int)
+# (processor, klucz, szablon) -> ile razy szablon użył wartości
+_used = defaultdict(int)
+_lock = threading.Lock()
+
+# nazwa szablonu, dla którego RequestContext właśnie wywołuje processory
+_local = threading.local()
+_installed = False
+
+
+def install():
+    # processor dostaje tylko request; nazwę szablonu podaje mu owinięte
+    # RequestContext.bind_template, bez zaglądania na stos
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    bind_template = RequestContext.bind_template
+
+    @contextmanager
+    def named_bind_template(self, template):
+        origin = getattr(template, 'origin', None)
+        previous = getattr(_local, 'template', None)
+        _local.template = getattr(origin, 'template_name', None) or '<inline>'
+        try:
+            with bind_template(self, template):
+                yield
+        finally:
+            _local.template = previous
+
+    RequestContext.bind_template = named_bind_template
+
+
+def _lazy(processor, key, template, value):
+    # SimpleLazyObject liczy wartość przy pierwszym użyciu w szablonie
+    # (str, iteracja, atrybut); wspólna dla requestu wartość value
+    # liczy się raz, a licznik mówi, które szablony po nią sięgnęły
+    def evaluate():
+        with _lock:
+            _used[(processor, key, template)] += 1
+        return value()
+
+    return SimpleLazyObject(evaluate)
+
+
+def lazy_context_processor(func):
+    # func zwraca słownik bezargumentowych funkcji zamiast wartości;
+    # wyniki są zapamiętane na obiekcie request, więc kolejne render()
+    # w tym samym requeście nie liczą niczego od nowa
+    name = f'{func.__module__}.{func.__qualname__}'
+    install()
+
+    @functools.wraps(func)
+    def processor(request):
+        with _lock:
+            _offered[name] += 1
+        template = getattr(_local, 'template', None) or '<python>'
+        memo = request.__dict__.setdefault('_lazy_context', {})
+        if name not in memo:
+            memo[name] = {key: functools.lru_cache(maxsize=None)(value)
+                          for key, value in func(request).items()}
+        if (name, template) not in memo:
+            memo[(name, template)] = {
+                key: _lazy(name, key, template, value)
+                for key, value in memo[name].items()}
+        return memo[(name, template)]
+
+    return processor
+
+
+def usage():
+    with _lock:
+        report = {name: {'offered': count, 'used': {}}
+                  for name, count in _offered.items()}
+        for (name, key, template), count in _used.items():
+            report[name]['used'].setdefault(key, {})[template] = count
+    return report
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+from collections import defaultdict
+
+from django import template
+from django.core.cache import caches
+from django.template.loader_tags import IncludeNode
+from django.template.loaders.cached import Loader as CachedLoader
+
+from .http_cache import is_anonymous
+
+# biblioteka szablonów podpięta w TEMPLATES['OPTIONS']['libraries'],
+# w szablonie {% load fragments %}
+register = template.Library()
+
+CACHE_ALIAS = 'template_fragments'
+
+# nazwa fragmentu -> {'hits': ..., 'misses': ...}
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+_lock = threading.Lock()
+
+
+def _count(name, result):
+    with _lock:
+        _stats[name][result] += 1
+
+
+def _version(node, context, includes):
+    # zmiana pliku z tagiem albo szablonu włączonego we fragmencie
+    # daje nowy klucz, stare wpisy po prostu wygasają
+    engine = context.template.engine
+    paths = [node.origin.name]
+    for name in includes:
+        if isinstance(name, str):
+            paths.append(engine.find_template(name)[1].name)
+        elif hasattr(name, 'origin'):
+            paths.append(name.origin.name)
+    mtimes = [os.path.getmtime(path) for path in paths
+              if path and os.path.exists(path)]
+    return '%x' % int(max(mtimes, default=0))
+
+
+def _user_state(context):
+    # bez ciasteczka sesji użytkownik jest anonimowy i nie trzeba
+    # sięgać do bazy; tak wygląda większość ruchu
+    request = context.get('request')
+    if request is not None and is_anonymous(request):
+        return 'anonymous'
+    user = context.get('user')
+    if user is None or not user.is_authenticated:
+        return 'anonymous'
+    return f'user:{user.pk}'
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.includes = nodelist.get_nodes_by_type(IncludeNode)
+        # włączane szablony -> wersja; węzeł żyje tyle co skompilowany
+        # szablon, z cached.Loader - do końca procesu, więc pliki czytamy
+        # raz, tak jak loader
+        self.versions = {}
+
+    def version(self, context):
+        includes = tuple(include.template.resolve(context)
+                         for include in self.includes)
+        if not isinstance(context.template.engine.template_loaders[0],
+                          CachedLoader):
+            return _version(self, context, includes)
+        try:
+            return self.versions[includes]
+        except KeyError:
+            return self.versions.setdefault(
+                includes, _version(self, context, includes))
+
+    def render(self, context):
+        vary_on = [str(var.resolve(context)) for var in self.vary_on]
+        digest = hashlib.md5(
+            '\x00'.join([_user_state(context), *vary_on]).encode()
+        ).hexdigest()
+        key = f'fragment:{self.name}:{self.version(context)}:{digest}'
+
+        cache = caches[CACHE_ALIAS]
+        value = cache.get(key)
+        if value is None:
+            _count(self.name, 'misses')
+            value = self.nodelist.render(context)
+            cache.set(key, value)
+        else:
+            _count(self.name, 'hits')
+        return value
+
+
+@register.tag
+def fragment(parser, token):
+    # {% fragment "nav" current_section %}...{% endfragment %}
+    # treść cachowana pod nazwą fragmentu, wartościami zmiennych z taga,
+    # stanem użytkownika i wersją plików szablonów
+    bits = token.split_contents()
+    if len(bits) < 2 or bits[1][0] not in '\'"' or bits[1][-1] != bits[1][0]:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]!r} tag requires a quoted fragment name.')
+    nodelist = parser.parse(('endfragment',))
+    parser.delete_first_token()
+    return FragmentNode(nodelist, bits[1][1:-1],
+                        [parser.compile_filter(bit) for bit in bits[2:]])
+
+
+def stats():
+    with _lock:
+        report = {name: dict(counts) for name, counts in _stats.items()}
+    for counts in report.values():
+        total = counts['hits'] + counts['misses']
+        counts['hit_rate'] = counts['hits'] / total if total else None
+    return report
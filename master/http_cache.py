@@ -0,0 +1,96 @@
+import functools
+import os
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.template.utils import get_app_template_dirs
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                quote_etag)
+
+CACHE_ALIAS = 'pages'
+
+_templates_version = None
+_lock = threading.Lock()
+
+
+def is_anonymous(request):
+    # bez ciasteczka sesji nie ma zalogowanego użytkownika,
+    # a sprawdzenie nie sięga do bazy
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES
+
+
+def _scan_templates(engine):
+    latest = 0
+    for directory in [*engine.dirs, *get_app_template_dirs('templates')]:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                latest = max(latest,
+                             os.path.getmtime(os.path.join(root, name)))
+    return '%x' % int(latest)
+
+
+def templates_version():
+    # najnowszy mtime plików szablonów; z cached.Loader proces renderuje
+    # szablony w wersji z chwili kompilacji, więc liczymy raz na proces
+    global _templates_version
+    engine = engines['django'].engine
+    if not isinstance(engine.template_loaders[0], CachedLoader):
+        return _scan_templates(engine)
+    if _templates_version is None:
+        with _lock:
+            if _templates_version is None:
+                _templates_version = _scan_templates(engine)
+    return _templates_version
+
+
+def cache_policy(etag, max_age=0, private=False, page_cache=False):
+    # etag(request, *args, **kwargs) - tani odpowiednik treści strony,
+    # np. wersja danych i szablonów, bez wykonywania widoku;
+    # max_age - liczba sekund albo funkcja od requestu;
+    # private - strona zależy od klienta, proxy nie może jej współdzielić;
+    # page_cache - gotowe odpowiedzi dla anonimowych klientów w cache
+    # 'pages', pod kluczem z ETag, więc nowa wersja danych to nowy klucz
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            tag = quote_etag(etag(request, *args, **kwargs))
+            # 304 zanim widok cokolwiek policzy
+            response = get_conditional_response(request, etag=tag)
+            if response is None:
+                response = _render(view, request, tag, page_cache,
+                                   args, kwargs)
+
+            if response.status_code in (200, 304):
+                response['ETag'] = tag
+                age = max_age(request) if callable(max_age) else max_age
+                if private:
+                    patch_cache_control(response, private=True, max_age=age)
+                else:
+                    patch_cache_control(response, public=True, max_age=age)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _render(view, request, tag, page_cache, args, kwargs):
+    if not (page_cache and is_anonymous(request)):
+        return view(request, *args, **kwargs)
+
+    cache = caches[CACHE_ALIAS]
+    key = f'page:{request.method}:{tag}:{request.get_full_path()}'
+    response = cache.get(key)
+    if response is None:
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming \
+                and not response.cookies:
+            cache.set(key, response)
+    return response
@@ -0,0 +1,22 @@
+import threading
+
+from django.template import Template
+
+# skompilowane szablony podawane w kodzie jako string;
+# kluczem jest sam tekst szablonu - str pamięta swój hash,
+# więc dla literału z widoku lookup nie przelicza go przy każdym requeście
+_compiled = {}
+_lock = threading.Lock()
+
+
+def inline_template(source):
+    try:
+        return _compiled[source]
+    except KeyError:
+        pass
+
+    with _lock:
+        # drugi wątek mógł skompilować szablon, kiedy czekaliśmy na lock
+        if source not in _compiled:
+            _compiled[source] = Template(source)
+        return _compiled[source]
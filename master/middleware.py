@@ -0,0 +1,160 @@
+import atexit
+import random
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from . import profiling
+
+
+class ProfilingMiddleware:
+    # czas requestu, zapytania SQL, render szablonów i context processory,
+    # zbierane dla części requestów (SAMPLE_RATE) i agregowane po nazwie url
+
+    def __init__(self, get_response):
+        options = getattr(settings, 'PROFILING', {})
+        if not options.get('ENABLED'):
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.sample_rate = options.get('SAMPLE_RATE', 1.0)
+        profiling.install()
+        if options.get('DUMP_FILE'):
+            atexit.register(profiling.dump, options['DUMP_FILE'])
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        # zapytania zapisuje tylko debug cursor, również przy DEBUG = False
+        databases = list(connections.all())
+        forced = [db.force_debug_cursor for db in databases]
+        logged = [len(db.queries_log) for db in databases]
+        for db in databases:
+            db.force_debug_cursor = True
+
+        start = perf_counter()
+        try:
+            with profiling.collect() as timings:
+                response = self.get_response(request)
+            wall = perf_counter() - start
+        finally:
+            for db, force in zip(databases, forced):
+                db.force_debug_cursor = force
+
+        queries = [query
+                   for db, count in zip(databases, logged)
+                   for query in list(db.queries_log)[count:]]
+
+        match = request.resolver_match
+        name = (match.url_name or match.view_name) if match else '<unresolved>'
+        values = {
+            'wall': wall * 1000,
+            'db': sum(float(query['time']) for query in queries) * 1000,
+            'db_queries': len(queries),
+        }
+        # template, context_processors i warstwy middleware:*
+        values.update((metric, seconds * 1000)
+                      for metric, seconds in timings.items())
+        profiling.record(name, values)
+        return response
+
+
+class _Layer:
+    # warstwa stosu z profilu; czas mierzony razem z warstwami wewnętrznymi,
+    # MiddlewareProfiles zamienia go potem na czas samej warstwy
+
+    def __init__(self, name, middleware):
+        self.name = name
+        self.middleware = middleware
+
+    def __call__(self, request):
+        start = perf_counter()
+        try:
+            return self.middleware(request)
+        finally:
+            profiling.add(self.name, perf_counter() - start)
+
+
+class _Profile:
+    def __init__(self, paths, get_response):
+        self.names = []
+        self.view_middleware = []
+        self.template_response_middleware = []
+        self.exception_middleware = []
+
+        # jak BaseHandler.load_middleware, tylko dla części stosu
+        handler = convert_exception_to_response(
+            _Layer('middleware:<view>', get_response))
+        for path in reversed(paths):
+            try:
+                instance = import_string(path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            if hasattr(instance, 'process_view'):
+                self.view_middleware.insert(0, instance.process_view)
+            if hasattr(instance, 'process_template_response'):
+                self.template_response_middleware.append(
+                    instance.process_template_response)
+            if hasattr(instance, 'process_exception'):
+                self.exception_middleware.append(instance.process_exception)
+            name = f'middleware:{path.rsplit(".", 1)[-1]}'
+            self.names.insert(0, name)
+            handler = convert_exception_to_response(_Layer(name, instance))
+        self.names.append('middleware:<view>')
+        self.chain = handler
+
+
+class MiddlewareProfiles:
+    # część stosu middleware wybierana po prefiksie adresu
+    # (MIDDLEWARE_PROFILE_PREFIXES, najdłuższy pasujący, inaczej 'default'),
+    # np. lekkie widoki bez sesji, csrf i użytkownika;
+    # process_view i pozostałe haki przekazuje do middleware z profilu
+
+    def __init__(self, get_response):
+        profiles = settings.MIDDLEWARE_PROFILES
+        self.profiles = {name: _Profile(paths, get_response)
+                         for name, paths in profiles.items()}
+        self.prefixes = sorted(settings.MIDDLEWARE_PROFILE_PREFIXES.items(),
+                               key=lambda item: len(item[0]), reverse=True)
+
+    def profile_for(self, path):
+        for prefix, name in self.prefixes:
+            if path.startswith(prefix):
+                return self.profiles[name]
+        return self.profiles['default']
+
+    def __call__(self, request):
+        profile = request._middleware_profile = self.profile_for(
+            request.path_info)
+        response = profile.chain(request)
+
+        timings = profiling.current()
+        if timings is not None:
+            # czas warstwy bez warstw, które wywołała
+            inclusive = [timings.get(name, 0) for name in profile.names]
+            for name, outer, inner in zip(profile.names, inclusive,
+                                          inclusive[1:] + [0]):
+                timings[name] = outer - inner
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        for method in request._middleware_profile.view_middleware:
+            response = method(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+
+    def process_template_response(self, request, response):
+        for method in request._middleware_profile.template_response_middleware:
+            response = method(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        for method in request._middleware_profile.exception_middleware:
+            response = method(request, exception)
+            if response is not None:
+                return response
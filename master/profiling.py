@@ -0,0 +1,132 @@
+import bisect
+import json
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.template import base as template_base
+from django.template.context import RequestContext
+
+# górne granice kubełków histogramu w milisekundach
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+METRICS = ('wall', 'db', 'db_queries', 'template', 'context_processors')
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        # górna granica kubełka, w którym wypada percentyl
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'buckets': dict(zip([str(b) for b in BUCKETS] + ['inf'],
+                                self.counts)),
+        }
+
+
+_local = threading.local()
+_histograms = {}
+_lock = threading.Lock()
+_installed = False
+
+
+def current():
+    # czasy mierzonego requestu albo None poza collect()
+    return getattr(_local, 'timings', None)
+
+
+def add(name, seconds):
+    timings = current()
+    if timings is not None:
+        timings[name] = timings.get(name, 0) + seconds
+
+
+def install():
+    # pomiar szablonów i context processorów wymaga owinięcia metod django;
+    # poza próbkowanymi requestami wrapper kosztuje jeden getattr
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    render = template_base.Template.render
+    bind_template = RequestContext.bind_template
+
+    def timed_render(self, context):
+        depth = getattr(_local, 'depth', 0)
+        _local.depth = depth + 1
+        start = perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            _local.depth = depth
+            # include i extends renderują się wewnątrz zewnętrznego szablonu
+            if not depth:
+                add('template', perf_counter() - start)
+
+    @contextmanager
+    def timed_bind_template(self, template):
+        start = perf_counter()
+        with bind_template(self, template):
+            add('context_processors', perf_counter() - start)
+            yield
+
+    template_base.Template.render = timed_render
+    RequestContext.bind_template = timed_bind_template
+
+
+@contextmanager
+def collect():
+    _local.timings = {'template': 0, 'context_processors': 0}
+    try:
+        yield _local.timings
+    finally:
+        _local.timings = None
+
+
+def record(name, values):
+    # poza METRICS także np. czasy warstw middleware
+    with _lock:
+        histograms = _histograms.setdefault(
+            name, {metric: Histogram() for metric in METRICS})
+        for metric, value in values.items():
+            histograms.setdefault(metric, Histogram()).add(value)
+
+
+def stats():
+    with _lock:
+        return {name: {metric: histogram.as_dict()
+                       for metric, histogram in histograms.items()}
+                for name, histograms in _histograms.items()}
+
+
+def dump(path):
+    with open(path, 'w') as f:
+        json.dump(stats(), f, indent=2, sort_keys=True)
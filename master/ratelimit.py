@@ -0,0 +1,126 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+# ile kubełków trzyma pamięć procesu; wypadają najdawniej używane,
+# a nieużywany kubełek i tak jest już pełny
+MAX_BUCKETS = 10000
+
+
+def refill(state, rate, burst, now):
+    # state - (żetony, czas) albo None dla nowego, pełnego kubełka
+    if state is None:
+        return float(burst)
+    tokens, stamp = state
+    return min(float(burst), tokens + max(0.0, now - stamp) * rate)
+
+
+def take(state, rate, burst, now):
+    # zwraca nowy stan i liczbę sekund do wolnego żetonu (0 - przepuszczamy)
+    tokens = refill(state, rate, burst, now)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / rate
+
+
+class LocalStore:
+    # kubełki w pamięci procesu - każdy worker liczy osobno
+
+    def __init__(self, max_buckets=MAX_BUCKETS):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_buckets = max_buckets
+
+    def take(self, key, rate, burst):
+        with self._lock:
+            state, retry_after = take(self._buckets.get(key), rate, burst,
+                                      time.monotonic())
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheStore:
+    # kubełki w cache, np. memcached albo FileBasedCache wspólnym dla
+    # workerów; odczyt i zapis nie są atomowe, więc przy równoległych
+    # requestach tego samego klienta przejdzie najwyżej kilka więcej
+
+    def __init__(self, alias):
+        self.alias = alias
+
+    def take(self, key, rate, burst):
+        cache = caches[self.alias]
+        key = f'ratelimit:{key}'
+        state, retry_after = take(cache.get(key), rate, burst, time.time())
+        # po tym czasie kubełek i tak byłby pełny
+        cache.set(key, state, math.ceil(burst / rate) + 1)
+        return retry_after
+
+
+_local = LocalStore()
+
+
+def get_store():
+    alias = settings.RATE_LIMIT_CACHE
+    return _local if alias is None else CacheStore(alias)
+
+
+def reset():
+    _local.clear()
+
+
+def client_address(request):
+    address = request.META.get('REMOTE_ADDR', 'unknown')
+    proxies = settings.RATE_LIMIT_TRUSTED_PROXIES
+    if address not in proxies:
+        return address
+    # każde proxy dopisuje na końcu adres, od którego dostało request;
+    # wcześniejsze wpisy mógł podać sam klient
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    for hop in reversed([hop.strip() for hop in forwarded.split(',')]):
+        if hop:
+            address = hop
+            if hop not in proxies:
+                break
+    return address
+
+
+class RateLimitMiddleware:
+    # kubełek żetonów na (adres klienta, nazwa url) dla adresów
+    # z RATE_LIMITS; po wyczerpaniu 429 z Retry-After, zanim widok
+    # zapyta bazę albo zapisze wiadomość
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        name = request.resolver_match.view_name
+        limit = settings.RATE_LIMITS.get(name)
+        if limit is None or request.method not in limit['METHODS']:
+            return None
+        address = client_address(request)
+        if address in settings.RATE_LIMIT_EXEMPT_IPS:
+            return None
+
+        retry_after = get_store().take(f'{name}:{address}', limit['RATE'],
+                                       limit['BURST'])
+        if not retry_after:
+            return None
+        response = HttpResponse('Too many requests, try again later.\n',
+                                content_type='text/plain', status=429)
+        response['Retry-After'] = str(math.ceil(retry_after))
+        return response
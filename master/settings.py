@@ -44,15 +44,84 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'master.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'master.ratelimit.RateLimitMiddleware',
+    # stos z MIDDLEWARE_PROFILES wybrany po adresie
+    'master.middleware.MiddlewareProfiles',
+    'books.middleware.ReplicaPinningMiddleware',
 ]
 
+MIDDLEWARE_PROFILES = {
+    'default': [
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.common.CommonMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    ],
+    # widoki bez sesji, formularzy i zalogowanego użytkownika
+    'light': [
+        'django.middleware.common.CommonMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    ],
+}
+
+# prefiks adresu -> profil, wygrywa najdłuższy pasujący
+MIDDLEWARE_PROFILE_PREFIXES = {
+    '/hello/': 'light',
+    '/time/': 'light',
+    '/order_notice/': 'light',
+    '/greeting/': 'light',
+    '/utilities/': 'light',
+    '/testing/': 'light',
+    '/_stats/': 'light',
+}
+
+# master.middleware.ProfilingMiddleware, niezależnie od DEBUG
+# ENABLED - domyślnie wyłączony: owija Template.render
+# i RequestContext.bind_template, a mierzone requesty logują każde zapytanie
+# SAMPLE_RATE - jaka część requestów jest mierzona (0.0 - 1.0);
+# przy szukaniu wolnych widoków lokalnie można dać 1.0
+# DUMP_FILE - plik json ze statystykami, zapisywany przy wyjściu procesu
+# i przez /_stats/?dump=1
+PROFILING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.01,
+    'DUMP_FILE': None,
+}
+
+# master.ratelimit.RateLimitMiddleware - kubełek żetonów na adres klienta
+# (REMOTE_ADDR) i nazwę url; RATE - żetony na sekundę, BURST - pojemność
+# kubełka, czyli ile requestów naraz przechodzi po przerwie
+RATE_LIMITS = {
+    # każda wiadomość to zapis do kolejki i wysyłka e-maila
+    'contact:contact-form': {'RATE': 5 / 60, 'BURST': 5,
+                             'METHODS': ['POST']},
+    'books:books-search': {'RATE': 5, 'BURST': 20,
+                           'METHODS': ['GET', 'HEAD']},
+}
+
+# None - kubełki w pamięci procesu (osobne dla każdego workera);
+# alias z CACHES, np. memcached - limit wspólny dla wszystkich workerów
+RATE_LIMIT_CACHE = None
+
+# adresy bez limitu - tylko przy DEBUG (lokalny serwer, testy, benchmarks)
+RATE_LIMIT_EXEMPT_IPS = INTERNAL_IPS if DEBUG else []
+
+# adresy reverse proxy przed serwerem; dla requestów od nich adres klienta
+# to ostatni adres z X-Forwarded-For spoza tej listy, inaczej wszyscy
+# klienci dzielą kubełek proxy; nagłówka od innych adresów nie czytamy
+RATE_LIMIT_TRUSTED_PROXIES = []
+
+# master.singleflight - identyczne równoległe wyszukiwania czekają na
+# jedno zapytanie; None - tylko w obrębie procesu, alias z CACHES
+# wspólny dla workerów - również między procesami (blokada i wynik są
+# w tym cache); TIMEOUT - ważność blokady i najdłuższe czekanie (s)
+SINGLE_FLIGHT_CACHE = None
+SINGLE_FLIGHT_TIMEOUT = 10
+
 ROOT_URLCONF = 'master.urls'
 
 TEMPLATES = [
@@ -61,8 +130,15 @@ TEMPLATES = [
         'DIRS': [
             os.path.join(BASE_DIR, 'templates'),
         ],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # szablony z plików kompilowane raz na proces,
+            # zmiany w plikach wymagają restartu serwera
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -70,6 +146,10 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'master.views.custom_cp',
             ],
+            # {% load fragments %} - cache fragmentów szablonów
+            'libraries': {
+                'fragments': 'master.fragments',
+            },
             # 'string_if_invalid': 'ERROR'
         },
     },
@@ -77,6 +157,16 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'master.wsgi.application'
 
+# master.asgi - widoki działają w pulach wątków (master.asgi_handler);
+# widoki czekające na bazę mają osobną, większą pulę
+ASGI_THREADS = 8
+ASGI_IO_THREADS = 32
+ASGI_IO_VIEWS = [
+    'books:books-search',
+    'books:books-catalogue',
+    'contact:contact-form',
+]
+
 
 # Database
 # https://docs.djangoproject.com/en/1.11/ref/settings/#databases
@@ -85,9 +175,96 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # połączenie zostaje otwarte między requestami danego wątku
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# repliki do odczytu dla aplikacji books (books.routers.ReplicaRouter),
+# np. po dodaniu do DATABASES:
+# 'replica': {
+#     'ENGINE': 'django.db.backends.sqlite3',
+#     'NAME': os.path.join(BASE_DIR, 'db-replica.sqlite3'),
+#     'TEST': {'MIRROR': 'default'},
+# },
+# BOOKS_READ_REPLICAS = ['replica']
+# schemat: manage.py migrate --database replica
+# dane: manage.py replicate_books --loop
+BOOKS_READ_REPLICAS = []
+
+# przez ile sekund po zapisie klient czyta z bazy głównej
+BOOKS_REPLICA_LAG = 10
+
+# books.changelist - powyżej tej liczby wierszy admin pokazuje liczbę
+# szacowaną zamiast COUNT(*) na niefiltrowanej liście
+BOOKS_ADMIN_EXACT_COUNT_LIMIT = 10000
+
+DATABASE_ROUTERS = ['books.routers.ReplicaRouter']
+
+# ustawiane przez master.db na każdym nowym połączeniu sqlite
+# WAL - czytelnicy nie czekają na zapis (i odwrotnie)
+# synchronous NORMAL - w trybie WAL fsync tylko przy checkpoincie
+# cache_size w KiB (ujemna wartość), mmap_size w bajtach
+# busy_timeout w ms - zapis czeka na inny zapis zamiast od razu zgłaszać
+# 'database is locked'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,
+    'mmap_size': 268435456,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+
+# books-search można przełączyć na
+# django.core.cache.backends.filebased.FileBasedCache (LOCATION - katalog)
+# lub memcached, żeby wyniki były wspólne dla wielu procesów
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'books-search': {
+        'BACKEND': 'master.cache.LRUCache',
+        'LOCATION': 'books-search',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    # gotowe strony dla anonimowych klientów, master.http_cache
+    'pages': {
+        'BACKEND': 'master.cache.LRUCache',
+        'LOCATION': 'pages',
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+    # {% fragment %} z master.fragments
+    'template_fragments': {
+        'BACKEND': 'master.cache.LRUCache',
+        'LOCATION': 'template-fragments',
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+
+
+# E-mail
+# https://docs.djangoproject.com/en/1.11/topics/email/
+
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# adresat wiadomości z formularza kontaktowego (contact.outbox)
+CONTACT_RECIPIENT = 'siteowner@example.com'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
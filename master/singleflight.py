@@ -0,0 +1,114 @@
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+# co ile sekund proces bez blokady sprawdza, czy wynik jest już w cache
+POLL_INTERVAL = 0.05
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group:
+    # identyczne równoległe wywołania (ten sam klucz) czekają na jedno,
+    # które liczy wynik, i dostają ten sam obiekt; po zakończeniu klucz
+    # jest zwalniany - to nie jest cache
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'shared': 0, 'waited': 0}
+
+    def do(self, key, compute, recheck=None):
+        # z SINGLE_FLIGHT_CACHE również blokada między procesami;
+        # recheck() - wynik, który mógł już trafić do cache, albo None
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self._stats['shared'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._compute(key, compute, recheck)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _compute(self, key, compute, recheck):
+        alias = settings.SINGLE_FLIGHT_CACHE
+        if alias is None:
+            return compute()
+
+        # blokada przez cache.add - tylko jeden proces liczy, a wynik
+        # zostawia w tym samym cache pod kluczem z tokenem blokady;
+        # pozostałe procesy czekają na niego, po SINGLE_FLIGHT_TIMEOUT
+        # liczą same (blokujący proces mógł zginąć)
+        cache = caches[alias]
+        # memcached nie przyjmie spacji ani długich kluczy
+        lock_key = f'singleflight:{hashlib.md5(key.encode()).hexdigest()}'
+        token = uuid.uuid4().hex
+        timeout = settings.SINGLE_FLIGHT_TIMEOUT
+        deadline = time.monotonic() + timeout
+        holder = None
+        while not cache.add(lock_key, token, timeout):
+            if time.monotonic() >= deadline:
+                return compute()
+            time.sleep(POLL_INTERVAL)
+            # token zapamiętany - wynik może się pojawić już po zwolnieniu
+            holder = cache.get(lock_key) or holder
+            result = self._shared(cache, lock_key, holder, recheck)
+            if result is not None:
+                with self._lock:
+                    self._stats['waited'] += 1
+                return result[0]
+
+        try:
+            # wynik mógł się pojawić, zanim wzięliśmy blokadę
+            result = self._shared(cache, lock_key, holder, recheck)
+            if result is not None:
+                return result[0]
+            value = compute()
+            cache.set(f'{lock_key}:{token}', (value,), timeout)
+            return value
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    def _shared(self, cache, lock_key, holder, recheck):
+        # (wynik,) albo None; recheck() - np. cache wyszukiwań, jeśli
+        # jest wspólny dla procesów
+        if holder is not None:
+            result = cache.get(f'{lock_key}:{holder}')
+            if result is not None:
+                return result
+        if recheck is not None:
+            value = recheck()
+            if value is not None:
+                return (value,)
+        return None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
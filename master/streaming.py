@@ -0,0 +1,39 @@
+import itertools
+import uuid
+
+from django.http import StreamingHttpResponse
+from django.template import loader
+from django.utils.safestring import mark_safe
+
+CHUNK_SIZE = 200
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_template(request, template_name, context, rows, rows_template,
+                    chunk_size=CHUNK_SIZE, content_type=None):
+    # szablon strony renderowany raz, z markerem zamiast {{ rows }};
+    # wiersze renderuje rows_template ({% for row in rows %}) paczkami,
+    # więc w pamięci jest najwyżej jedna paczka, a pierwszy bajt
+    # wychodzi przed pobraniem wierszy
+    marker = f'<!--rows:{uuid.uuid4().hex}-->'
+    page = loader.render_to_string(
+        template_name, {**context, 'rows': mark_safe(marker)}, request)
+    head, tail = page.split(marker)
+    row_template = loader.get_template(rows_template)
+
+    def render():
+        yield head
+        for chunk in _chunks(rows, chunk_size):
+            # bez requestu - context processory policzyła już strona
+            yield row_template.render({'rows': chunk})
+        yield tail
+
+    return StreamingHttpResponse(render(), content_type=content_type)
@@ -0,0 +1,271 @@
+import asyncio
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection, connections
+from django.http import HttpResponse
+from django.template import Context, Engine, RequestContext
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+
+from . import fragments, profiling
+from .context_processors import lazy_context_processor, usage
+from .middleware import MiddlewareProfiles, ProfilingMiddleware
+from .asgi_handler import ASGIHandler
+
+
+class ASGIHandlerTests(SimpleTestCase):
+    def request(self, application, headers=()):
+        scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET',
+                 'scheme': 'http', 'path': '/hello/', 'query_string': b'',
+                 'root_path': '', 'headers': list(headers),
+                 'client': ('127.0.0.1', 50000),
+                 'server': ('localhost', 80)}
+        messages = [{'type': 'http.request', 'body': b''}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        handler = ASGIHandler(application, threads=4, io_threads=4)
+        asyncio.get_event_loop().run_until_complete(
+            handler(scope, receive, send))
+        return sent
+
+    def test_streaming_body_stays_on_one_thread(self):
+        threads = []
+
+        class Body:
+            def __iter__(self):
+                for chunk in (b'a', b'b', b'c'):
+                    threads.append(threading.get_ident())
+                    yield chunk
+
+            def close(self):
+                threads.append(threading.get_ident())
+
+        def application(environ, start_response):
+            threads.append(threading.get_ident())
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return Body()
+
+        sent = self.request(application)
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(b''.join(m.get('body', b'') for m in sent[1:]),
+                         b'abc')
+        self.assertFalse(sent[-1].get('more_body'))
+        self.assertEqual(len(threads), 5)
+        self.assertEqual(len(set(threads)), 1)
+
+    def test_repeated_cookie_headers(self):
+        environ = {}
+
+        def application(env, start_response):
+            environ.update(env)
+            start_response('204 No Content', [])
+            return []
+
+        self.request(application, [(b'cookie', b'a=1'), (b'cookie', b'b=2'),
+                                   (b'accept', b'text/html'),
+                                   (b'accept', b'*/*')])
+        self.assertEqual(environ['HTTP_COOKIE'], 'a=1; b=2')
+        self.assertEqual(environ['HTTP_ACCEPT'], 'text/html,*/*')
+
+
+class FragmentTests(SimpleTestCase):
+    def setUp(self):
+        caches[fragments.CACHE_ALIAS].clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.include = os.path.join(self.directory.name, 'item.html')
+        with open(self.include, 'w') as f:
+            f.write('{{ render }}')
+        with open(os.path.join(self.directory.name, 'page.html'), 'w') as f:
+            f.write('{% load fragments %}{% fragment "test" section %}'
+                    '{% include "item.html" %}{% endfragment %}')
+        self.renders = 0
+
+    def engine(self, cached=False):
+        loaders = ['django.template.loaders.filesystem.Loader']
+        if cached:
+            loaders = [('django.template.loaders.cached.Loader', loaders)]
+        return Engine(dirs=[self.directory.name], loaders=loaders,
+                      libraries={'fragments': 'master.fragments'})
+
+    def render(self, engine, section='books'):
+        def render():
+            self.renders += 1
+            return self.renders
+        return engine.get_template('page.html').render(
+            Context({'section': section, 'render': render}))
+
+    def touch(self):
+        mtime = os.path.getmtime(self.include) + 10
+        os.utime(self.include, (mtime, mtime))
+
+    def test_hit_skips_rendering(self):
+        engine = self.engine()
+        hits = fragments.stats().get('test', {}).get('hits', 0)
+        self.assertEqual(self.render(engine), '1')
+        self.assertEqual(self.render(engine), '1')
+        self.assertEqual(self.renders, 1)
+        self.assertEqual(fragments.stats()['test']['hits'], hits + 1)
+
+    def test_vary_on_gives_new_key(self):
+        engine = self.engine()
+        self.assertEqual(self.render(engine, 'books'), '1')
+        self.assertEqual(self.render(engine, 'contact'), '2')
+        self.assertEqual(self.render(engine, 'books'), '1')
+
+    def test_changed_include_gives_new_key(self):
+        engine = self.engine()
+        self.assertEqual(self.render(engine), '1')
+        self.touch()
+        self.assertEqual(self.render(engine), '2')
+
+    def test_cached_loader_reads_mtime_once(self):
+        engine = self.engine(cached=True)
+        with mock.patch('master.fragments.os.path.getmtime',
+                        wraps=os.path.getmtime) as getmtime:
+            self.assertEqual(self.render(engine), '1')
+            self.assertEqual(self.render(engine), '1')
+        # plik strony i włączony szablon, raz na proces
+        self.assertEqual(getmtime.call_count, 2)
+
+
+@lazy_context_processor
+def users_cp(request):
+    return {'users': lambda: User.objects.count()}
+
+
+class LazyContextProcessorTests(TestCase):
+    engine = Engine(loaders=[('django.template.loaders.locmem.Loader', {
+        'nothing.html': 'nothing',
+        'users.html': '{{ users }} {% if users %}x{% endif %}',
+        'count.html': '{{ users }}',
+    })])
+
+    def render(self, name, request=None):
+        request = request or RequestFactory().get('/')
+        context = RequestContext(request, {}, [users_cp])
+        return self.engine.get_template(name).render(context)
+
+    def used(self, template):
+        name = f'{users_cp.__module__}.{users_cp.__qualname__}'
+        used = usage().get(name, {}).get('used', {})
+        return used.get('users', {}).get(template, 0)
+
+    def test_unused_value_is_not_computed(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render('nothing.html'), 'nothing')
+        self.assertEqual(self.used('nothing.html'), 0)
+
+    def test_value_is_computed_once_and_attributed_per_template(self):
+        used = {name: self.used(name) for name in ('users.html', 'count.html')}
+        request = RequestFactory().get('/')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.render('users.html', request), '0 ')
+            self.assertEqual(self.render('count.html', request), '0')
+            self.assertEqual(self.render('nothing.html', request), 'nothing')
+        self.assertEqual(self.used('users.html'), used['users.html'] + 1)
+        self.assertEqual(self.used('count.html'), used['count.html'] + 1)
+        self.assertEqual(self.used('nothing.html'), 0)
+
+
+class ProfilingTests(TestCase):
+    def count(self, name='hello'):
+        return profiling.stats().get(name, {}).get('wall', {}).get('count', 0)
+
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(HttpResponse)
+
+    def test_sampled_request_is_recorded(self):
+        def view(request):
+            User.objects.count()
+            return HttpResponse()
+
+        before = self.count('profiled')
+        with override_settings(PROFILING={'ENABLED': True,
+                                          'SAMPLE_RATE': 1.0}):
+            middleware = ProfilingMiddleware(view)
+        request = RequestFactory().get('/')
+        request.resolver_match = mock.Mock(url_name='profiled')
+        middleware(request)
+        self.assertEqual(self.count('profiled'), before + 1)
+        queries = profiling.stats()['profiled']['db_queries']
+        self.assertEqual(queries['max'], 1)
+        self.assertFalse(connection.force_debug_cursor)
+
+    def test_request_outside_sample_is_not_recorded(self):
+        before = self.count()
+        with override_settings(PROFILING={'ENABLED': True,
+                                          'SAMPLE_RATE': 0.0}):
+            self.client.get('/hello/', HTTP_HOST='localhost')
+        self.assertEqual(self.count(), before)
+
+
+class SQLitePragmasTests(SimpleTestCase):
+    def test_pragmas_on_new_connection(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        default = connections['default']
+        settings_dict = dict(default.settings_dict,
+                             NAME=os.path.join(directory.name, 'db.sqlite3'))
+        wrapper = type(default)(settings_dict, 'pragmas')
+        self.addCleanup(wrapper.close)
+        with wrapper.cursor() as cursor:
+            values = {}
+            for name in ('journal_mode', 'synchronous', 'cache_size',
+                         'busy_timeout', 'temp_store'):
+                cursor.execute(f'PRAGMA {name}')
+                values[name] = cursor.fetchone()[0]
+        # synchronous NORMAL = 1, temp_store MEMORY = 2
+        self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1,
+                                  'cache_size': -20000,
+                                  'busy_timeout': 5000, 'temp_store': 2})
+
+
+class MiddlewareProfilesTests(SimpleTestCase):
+    def setUp(self):
+        self.seen = []
+
+        def view(request):
+            self.seen.append(hasattr(request, 'session'))
+            return HttpResponse()
+
+        self.middleware = MiddlewareProfiles(view)
+
+    def test_profile_chosen_by_longest_prefix(self):
+        with override_settings(MIDDLEWARE_PROFILE_PREFIXES={
+                '/books/': 'light', '/books/search/': 'default'}):
+            middleware = MiddlewareProfiles(HttpResponse)
+        self.assertIs(middleware.profile_for('/books/search/'),
+                      middleware.profiles['default'])
+        self.assertIs(middleware.profile_for('/books/1/'),
+                      middleware.profiles['light'])
+        self.assertIs(middleware.profile_for('/contact/'),
+                      middleware.profiles['default'])
+
+    def test_light_profile_skips_session(self):
+        factory = RequestFactory()
+        self.middleware(factory.get('/hello/'))
+        self.middleware(factory.get('/contact/'))
+        self.assertEqual(self.seen, [False, True])
+
+    def test_layer_timings_exclude_inner_layers(self):
+        with profiling.collect() as timings:
+            self.middleware(RequestFactory().get('/hello/'))
+        self.assertEqual(
+            [name for name in timings if name.startswith('middleware:')],
+            ['middleware:<view>', 'middleware:XFrameOptionsMiddleware',
+             'middleware:CommonMiddleware'])
+        self.assertTrue(all(value >= 0 for value in timings.values()))
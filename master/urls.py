@@ -39,7 +39,13 @@ urlpatterns = [
     url(r'^cp/$', master_views.cp, name='cp'),
     url(r'^cpshort/$', master_views.cpshort, name='cpshort'),
     url(r'^cpglobal/$', master_views.cpglobal, name='cpglobal'),
+    # statystyki master.middleware.ProfilingMiddleware
+    url(r'^_stats/$', master_views.profiling_stats, name='profiling-stats'),
 ]
 
 if settings.DEBUG:
-    urlpatterns += [url(r'^debuginfo/$', master_views.debug), ]
+    urlpatterns += [
+        url(r'^debuginfo/$', master_views.debug),
+        url(r'^debuginfo/context-processors/$',
+            master_views.debug_context_processors),
+    ]
@@ -1,12 +1,46 @@
 from datetime import datetime, timedelta
 
+from django.conf import settings
 from django.core.urlresolvers import reverse
-from django.http import Http404, HttpResponse, HttpResponseNotFound
+from django.http import (Http404, HttpResponse, HttpResponseNotFound,
+                         JsonResponse)
 from django.shortcuts import render
-from django.template import Context, Template, RequestContext
+from django.template import Context, RequestContext
 from django.template.loader import get_template
 
+from . import fragments, profiling
+from .context_processors import lazy_context_processor, usage
+from .http_cache import cache_policy, templates_version
+from .inline_templates import inline_template
+from .streaming import stream_template
 
+
+# ETag widoków liczony bez wykonywania widoku, patrz master.http_cache
+
+def hello_etag(request):
+    return f'hello-{request.method}'
+
+
+def templates_etag(request):
+    return templates_version()
+
+
+def minute_etag(request):
+    # treść zmienia się co minutę, tak jak wyświetlany czas
+    now = datetime.now()
+    return f'{now:%Y%m%d%H%M}-{templates_version()}'
+
+
+def until_next_minute(request):
+    return 60 - datetime.now().second
+
+
+def client_etag(request):
+    # custom_cp pokazuje adres klienta
+    return f'{templates_version()}-{request.META["REMOTE_ADDR"]}'
+
+
+@cache_policy(etag=hello_etag, max_age=3600, page_cache=True)
 def hello(request):
     return HttpResponse(f'hello {request.method}')
 
@@ -63,7 +97,8 @@ def order_notice(request):
         </html>
     """
 
-    t = Template(t_raw)
+    # kompilujemy raz, przy pierwszym requeście
+    t = inline_template(t_raw)
 
     c = Context({
         'person_name': 'John Doe',
@@ -102,6 +137,7 @@ def current_datetime_render_shortcut(request):
     return render(request, 'current_datetime_new.html', {'current_date': now})
 
 
+@cache_policy(etag=templates_etag, max_age=300, page_cache=True)
 def greeting(request):
     sample_html = '<h2>hello</h2>'
     return render(request, 'greeting.html',
@@ -110,6 +146,7 @@ def greeting(request):
                    'sample_html': sample_html})
 
 
+@cache_policy(etag=minute_etag, max_age=until_next_minute, page_cache=True)
 def utilities_time(request):
     now = datetime.now()
     return render(request, 'utilities/time.html',
@@ -163,15 +200,35 @@ def utilities_request(request):
 def utilities_display_meta(request):
     meta_values = sorted(request.META.items())
 
-    return render(request, 'utilities/request_meta.html',
-                  {'current_section': 'request_meta',
-                   'meta_values': meta_values})
+    # wiersze tabeli wysyłane paczkami, patrz master.streaming
+    return stream_template(request, 'utilities/request_meta.html',
+                           {'current_section': 'request_meta'},
+                           meta_values, 'utilities/request_meta_rows.html')
 
 
 def debug(request):
     return HttpResponse('<html><body><p>Debug view</p></body></html>')
 
 
+def debug_context_processors(request):
+    # które wartości z context processorów faktycznie czytają szablony
+    return JsonResponse(usage())
+
+
+def profiling_stats(request):
+    # tylko lokalnie - statystyki zdradzają strukturę serwisu
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS:
+        raise Http404()
+
+    dump_file = settings.PROFILING.get('DUMP_FILE')
+    if 'dump' in request.GET and dump_file:
+        profiling.dump(dump_file)
+
+    return JsonResponse({'views': profiling.stats(),
+                         'context_processors': usage(),
+                         'fragments': fragments.stats()})
+
+
 def handler404(request):
     return HttpResponseNotFound('<html><body><p>Ooops... 404</p></body></html>')
 
@@ -181,10 +238,12 @@ def testing(request, num, meta):
     return HttpResponse(f'{num} - {meta} - {url_resolved}')
 
 
+@lazy_context_processor
 def custom_cp(request):
+    # wartości liczone dopiero przy pierwszym użyciu w szablonie
     return {
-        'app': 'My App',
-        'ip_address': request.META['REMOTE_ADDR']
+        'app': lambda: 'My App',
+        'ip_address': lambda: request.META['REMOTE_ADDR']
     }
 
 
@@ -195,7 +254,7 @@ def cp(request):
     # przyjmuje słownik
     # t = get_template('some_template.html')
 
-    t = Template('{{ app }} - {{ user }} - {{ ip_address }}')
+    t = inline_template('{{ app }} - {{ user }} - {{ ip_address }}')
     # możemy użyć nazwanego argumentu processors
     # ma to być lista lub krotka
     c = RequestContext(request, {'current_section': 'cp'}, [custom_cp])
@@ -212,6 +271,7 @@ def cpshort(request):
                   {'current_section': 'cpshort', 'cp': custom_cp(request)})
 
 
+@cache_policy(etag=client_etag, max_age=300, private=True)
 def cpglobal(request):
     return render(request, 'cpglobal.html',
                   {'current_section': 'cpglobal'})